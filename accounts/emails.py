@@ -0,0 +1,75 @@
+"""
+Account emails are recorded as an ``AccountEmail`` and delivered by a Celery
+task once the request's transaction commits, so signing up never waits on
+the mail server. With ``ACCOUNT_EMAIL_ASYNC`` off they are delivered before
+the request returns instead, which is what the tests want.
+"""
+import datetime
+import smtplib
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import AccountEmail
+
+
+def queue_account_email(user, kind, subject, body):
+    email = AccountEmail.objects.create(
+        user=user, kind=kind, to_email=user.email, subject=subject, body=body)
+    if settings.ACCOUNT_EMAIL_ASYNC:
+        from accounts.tasks import send_account_email
+
+        transaction.on_commit(lambda: send_account_email.delay(email.pk))
+    elif not deliver_account_email(email):
+        email.status = AccountEmail.FAILED
+        AccountEmail.objects.filter(pk=email.pk).update(status=email.status)
+    return email
+
+
+def deliver_account_email(email):
+    """ send an account email and record the outcome, returns whether it went out """
+    AccountEmail.objects.filter(pk=email.pk).update(attempts=F("attempts") + 1)
+    try:
+        EmailMessage(
+            subject=email.subject,
+            body=email.body,
+            from_email=settings.EMAIL_HOST_USER,
+            to=[email.to_email],
+        ).send()
+    except (smtplib.SMTPException, OSError) as e:
+        email.last_error = str(e) or e.__class__.__name__
+        AccountEmail.objects.filter(pk=email.pk).update(last_error=email.last_error)
+        return False
+
+    email.status, email.sent_at = AccountEmail.SENT, timezone.now()
+    AccountEmail.objects.filter(pk=email.pk).update(
+        status=email.status, sent_at=email.sent_at, last_error="")
+    return True
+
+
+def send_verification_email(user, current_site):
+    token = RefreshToken.for_user(user).access_token
+    scheme = "http" if settings.DEBUG else "https"
+    absurl = f'{scheme}://{current_site}{reverse("email-verify")}?token={token}'
+    return queue_account_email(
+        user, AccountEmail.VERIFICATION, "Verify your email",
+        f'Hi {user.first_name} Use the link below to verify your email \n{absurl}')
+
+
+def resend_verification_email(user, current_site):
+    """
+    Queue a fresh verification email unless one is still on its way, returns
+    the email that will reach the user or None if they are already verified.
+    """
+    if user.is_verified:
+        return None
+    recent = timezone.now() - datetime.timedelta(seconds=settings.ACCOUNT_EMAIL_RESEND_INTERVAL)
+    pending = user.account_emails.filter(
+        kind=AccountEmail.VERIFICATION, status=AccountEmail.PENDING, created_at__gte=recent,
+    ).order_by("-created_at").first()
+    return pending or send_verification_email(user, current_site)
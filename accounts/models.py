@@ -52,3 +52,35 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def get_full_name(self):
         return f'{self.first_name} {self.last_name}'
+
+
+class AccountEmail(models.Model):
+    """ an account email such as a verification link, and how its delivery went """
+    VERIFICATION = "verification"
+    PASSWORD_RESET = "password_reset"
+    KIND_CHOICES = [
+        (VERIFICATION, "Verification"),
+        (PASSWORD_RESET, "Password reset"),
+    ]
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="account_emails")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    to_email = models.EmailField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} email to {self.to_email} ({self.status})"
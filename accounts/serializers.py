@@ -28,6 +28,10 @@ class EmailVerificationSerializer(serializers.ModelSerializer):
         fields = ["token"]
 
 
+class ResendVerificationSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=255)
+
+
 class UserLoginSerializer(serializers.ModelSerializer):
     """Serializer to authenticate users with email and password"""
     email = serializers.EmailField()
@@ -0,0 +1,18 @@
+from celery import shared_task
+from django.conf import settings
+
+from accounts import emails
+from accounts.models import AccountEmail
+
+
+@shared_task(bind=True)
+def send_account_email(self, email_id):
+    """ deliver an account email, backing off between failed attempts """
+    email = AccountEmail.objects.filter(pk=email_id, status=AccountEmail.PENDING).first()
+    if email is None or emails.deliver_account_email(email):
+        return
+    if self.request.retries + 1 >= settings.ACCOUNT_EMAIL_MAX_ATTEMPTS:
+        AccountEmail.objects.filter(pk=email_id).update(status=AccountEmail.FAILED)
+        return
+    raise self.retry(countdown=settings.ACCOUNT_EMAIL_RETRY_DELAY * 2 ** self.request.retries,
+                     max_retries=settings.ACCOUNT_EMAIL_MAX_ATTEMPTS)
@@ -1,3 +1,39 @@
-from django.test import TestCase
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import AccountEmail, User
+
+
+@override_settings(ACCOUNT_EMAIL_ASYNC=False)
+class VerificationEmailTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def sign_up(self, email="ada@example.com"):
+        return self.client.post(reverse("signup"), {"email": email, "password": "secret-pass"})
+
+    def test_sign_up_sends_a_verification_email(self):
+        self.assertEqual(self.sign_up().status_code, 201)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(reverse("email-verify"), mail.outbox[0].body)
+
+    def test_resend_sends_a_new_link_to_an_unverified_user(self):
+        User.objects.create_user("ada@example.com", "secret-pass", is_verified=False)
+
+        response = self.client.post(reverse("email-verify-resend"), {"email": "ada@example.com"})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(AccountEmail.objects.filter(kind=AccountEmail.VERIFICATION).count(), 1)
+
+    def test_resend_sends_nothing_to_a_verified_user(self):
+        User.objects.create_user("verified@example.com", "secret-pass", is_verified=True)
+
+        response = self.client.post(reverse("email-verify-resend"), {"email": "verified@example.com"})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
@@ -4,5 +4,6 @@ from accounts import views
 urlpatterns = [
     path('signup/', views.UserSignUpView.as_view(), name='signup'),
     path('email-verify/', views.VerifyEmail.as_view(), name="email-verify"),
+    path('email-verify/resend/', views.ResendVerificationEmail.as_view(), name="email-verify-resend"),
     path("auth/login/", views.UserLoginAPIView.as_view(), name="login"),
 ]
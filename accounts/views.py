@@ -1,7 +1,6 @@
 import jwt
 
 from django.contrib.sites.shortcuts import get_current_site
-from django.urls import reverse
 from django.conf import settings
 
 from rest_framework.generics import GenericAPIView, CreateAPIView
@@ -13,10 +12,11 @@ from rest_framework.response import Response
 from accounts.serializers import (
     UserSerializer,
     UserLoginSerializer,
-    EmailVerificationSerializer
+    EmailVerificationSerializer,
+    ResendVerificationSerializer
 )
+from accounts.emails import resend_verification_email, send_verification_email
 from accounts.models import User
-from api.utils import Util
 
 
 class UserSignUpView(CreateAPIView):
@@ -31,23 +31,7 @@ class UserSignUpView(CreateAPIView):
             user = serializer.save()
             user_data = serializer.data
 
-            token = RefreshToken.for_user(user)
-            refresh = {
-                'refresh': str(token),
-                'access': str(token.access_token),
-            }
-            current_site = get_current_site(request).domain
-            relative_link = reverse("email-verify")
-
-            if settings.debug:
-                absurl = f'http://{current_site}{relative_link}?token={refresh["access"]}'
-                
-            absurl = f'https://{current_site}{relative_link}?token={refresh["access"]}'
-
-            email_body = f'Hi {user.first_name} Use the link below to verify your email \n{absurl}'
-            data = {"email_body": email_body, "to_email": user.email,
-                    "email_subject": "Verify your email"}
-            Util.send_email(data)
+            send_verification_email(user, get_current_site(request).domain)
 
             return Response(user_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -69,12 +53,29 @@ class VerifyEmail(GenericAPIView):
                 user.is_verified = True
                 user.save()
             return Response({"email": 'Successfully activated'}, status=status.HTTP_200_OK)
-        except jwt.ExpiredSigntureError as identifier:
+        except jwt.ExpiredSignatureError as identifier:
             return Response({"error": 'Activation Expired'}, status=status.HTTP_400_BAD_REQUEST)
         except jwt.exceptions.DecodeError as identifier:
             return Response({"error": 'Invalid Token'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class ResendVerificationEmail(GenericAPIView):
+    """ Send the email verification link again """
+    permission_classes = (AllowAny,)
+    authentication_classes = ()
+    serializer_class = ResendVerificationSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = User.objects.filter(email__iexact=serializer.validated_data["email"]).first()
+        if user is not None:
+            resend_verification_email(user, get_current_site(request).domain)
+        # the same answer either way, so this can't be used to find out who has an account
+        return Response({"email": "If that account needs verifying, a new link is on its way."},
+                        status=status.HTTP_202_ACCEPTED)
+
+
 class UserLoginAPIView(GenericAPIView):
     """
     An endpoint to authenticate existing users using their email and password.
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from accounts.models import User
-from api.models import Poll, Candidate, Vote, Voter
+from accounts.models import AccountEmail, User
+from api.models import BallotFlush, Poll, Candidate, CandidateTally, PendingBallot, PollEmail, PollResultSnapshot, Vote, Voter, VoterImportJob
 # Register your models here.
 
 
@@ -31,11 +31,29 @@ class UserAdmin(BaseUserAdmin):
     ]
 
 
+class VoteAdmin(admin.ModelAdmin):
+    """ votes only count through api.services, which keeps the tallies, so they can't be added or edited here """
+    list_display = ["poll", "candidate", "voted_by"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 search_fields = ("email",)
 ordering = ("email",)
 
 admin.site.register(User, UserAdmin)
+admin.site.register(AccountEmail)
 admin.site.register(Poll)
 admin.site.register(Candidate)
-admin.site.register(Vote)
+admin.site.register(Vote, VoteAdmin)
 admin.site.register(Voter)
+admin.site.register(CandidateTally)
+admin.site.register(PendingBallot)
+admin.site.register(BallotFlush)
+admin.site.register(PollResultSnapshot)
+admin.site.register(VoterImportJob)
+admin.site.register(PollEmail)
@@ -0,0 +1,85 @@
+"""
+Cached poll data, kept in the shared cache under per-poll versions.
+
+Every entry belongs to a poll and a namespace (``detail``, ``candidates`` or
+``results``). ``invalidate()`` bumps the version of the namespaces a change
+touches, so the stale entries are never read again and simply age out. The
+signal handlers in ``api.signals`` decide which namespaces each model change
+touches.
+
+``get_or_compute()`` is single-flight: on a miss one caller takes a short
+lock in the cache and recomputes, the others wait for its result instead of
+all running the same queries at once.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DETAIL = "detail"
+CANDIDATES = "candidates"
+RESULTS = "results"
+NAMESPACES = (DETAIL, CANDIDATES, RESULTS)
+
+# how long a recompute may hold the lock, and how often waiting callers look for its result
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+
+
+def version_key(poll_id, namespace):
+    return f"polls:{poll_id}:{namespace}:version"
+
+
+def get_version(poll_id, namespace):
+    key = version_key(poll_id, namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(poll_id, *namespaces):
+    """ drop the poll's entries in the namespaces, all of them by default, once the change commits """
+    versions = {
+        version_key(poll_id, namespace): uuid.uuid4().hex for namespace in namespaces or NAMESPACES
+    }
+    # bumped any earlier, a read could cache the old data under the new version before we commit
+    transaction.on_commit(lambda: cache.set_many(versions, timeout=None))
+
+
+def get_or_compute(poll_id, namespace, compute, variant="", timeout=None):
+    """
+    The cached value for the poll's namespace, computing and storing it with
+    ``compute()`` when there is none. ``variant`` tells apart entries of one
+    namespace, the page of a list for instance.
+    """
+    timeout = settings.POLL_CACHE_TIMEOUT if timeout is None else timeout
+    key = f"polls:{poll_id}:{namespace}:{get_version(poll_id, namespace)}:{variant}"
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock = f"{key}:lock"
+    if cache.add(lock, True, timeout=LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock)
+        return value
+
+    # someone else is computing it, wait for their result rather than repeat the work
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        if cache.get(lock) is None:
+            # it finished or failed, the read below picks up its value if it stored one
+            break
+        value = cache.get(key)
+        if value is not None:
+            return value
+    value = cache.get(key)
+    return compute() if value is None else value
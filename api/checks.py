@@ -0,0 +1,71 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# backends whose entries only the process that wrote them can see
+LOCAL_CACHE_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared():
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHE_BACKENDS
+
+
+def web_workers():
+    """ worker processes gunicorn starts, it reads the same variable """
+    return int(os.environ.get("WEB_CONCURRENCY", 1))
+
+
+@register(Tags.caches)
+def check_poll_cache(app_configs, **kwargs):
+    """
+    cached polls are invalidated in the process that changed them, the others
+    must see it. Only a warning, so the default settings still migrate.
+    """
+    if web_workers() > 1 and not cache_is_shared():
+        return [Warning(
+            f"WEB_CONCURRENCY is {web_workers()} but the cache is local to each process, "
+            "workers would serve cached polls and results other workers have invalidated "
+            f"for up to POLL_CACHE_TIMEOUT ({settings.POLL_CACHE_TIMEOUT}s).",
+            hint="Set CACHE_URL to a redis:// or memcached:// server the web and celery processes share.",
+            id="api.W003",
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_ballot_queue_cache(app_configs, **kwargs):
+    """
+    the flush is scheduled from the web processes and run by celery, and the
+    results it changes are invalidated from celery, so they need one cache
+    """
+    if settings.VOTE_INGESTION_MODE == "queued" and not cache_is_shared():
+        return [Error(
+            "VOTE_INGESTION_MODE is 'queued' but the cache is local to each process.",
+            hint="Set CACHE_URL to a redis:// or memcached:// server the web and celery processes share.",
+            id="api.E001",
+        )]
+    return []
+
+
+@register()
+def check_results_pubsub(app_configs, **kwargs):
+    """
+    tallies published in one process only reach streams in the same process
+    with LocalPubSub. Only a warning: served over WSGI there are no streams
+    for them to miss.
+    """
+    if settings.RESULTS_PUBSUB_BACKEND != "api.pubsub.LocalPubSub":
+        return []
+    if settings.VOTE_INGESTION_MODE == "queued" or web_workers() > 1:
+        return [Warning(
+            "RESULTS_PUBSUB_BACKEND is LocalPubSub but votes are written by more than one process, "
+            "live result streams served over ASGI would miss the votes of the other processes.",
+            hint="Set RESULTS_PUBSUB_BACKEND to api.pubsub.RedisPubSub, or serve the app from a single "
+                 "ASGI process with VOTE_INGESTION_MODE=direct.",
+            id="api.W002",
+        )]
+    return []
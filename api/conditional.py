@@ -0,0 +1,89 @@
+"""
+Validators for conditional GETs on polls and voters, each worked out with a
+single small query so an unchanged resource is answered with ``304`` before
+anything is serialized.
+
+A poll's ``last_updated`` moves whenever the poll is saved and, through
+``touch_poll()``, when its candidates or voters are edited. Its detail also
+says whether the poll is open, so the last time it opened or closed counts as
+a modification too. The poll list can show it as well and counts the last
+time any poll opened or closed.
+
+``?fields=``, ``?expand=`` and paging change the representation, so the
+query string is part of every ETag.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from api.models import Poll, Voter
+from api.registry import last_opened_or_closed
+
+
+def poll_modified(last_updated, start_time, end_time):
+    return max(last_updated, last_opened_or_closed(timezone.localtime(), start_time, end_time))
+
+
+def representation(request):
+    """ ETag suffix telling apart the representations the query string asks for """
+    query = request.GET.urlencode()
+    return f"-{hashlib.sha1(query.encode()).hexdigest()[:12]}" if query else ""
+
+
+def cached_on_request(function):
+    """ ``condition()`` asks for the etag and last modified separately, compute them once """
+    attribute = f"_{function.__name__}"
+
+    def wrapper(request, *args, **kwargs):
+        if not hasattr(request, attribute):
+            setattr(request, attribute, function(request, *args, **kwargs))
+        return getattr(request, attribute)
+    return wrapper
+
+
+@cached_on_request
+def poll_detail_modified(request, pk, **kwargs):
+    row = Poll.objects.filter(pk=pk).values_list("last_updated", "start_time", "end_time").first()
+    return row and poll_modified(*row)
+
+
+def poll_detail_etag(request, pk, **kwargs):
+    modified = poll_detail_modified(request, pk)
+    return modified and f"poll-{pk}-{modified.timestamp()}{representation(request)}"
+
+
+@cached_on_request
+def poll_list_state(request, *args, **kwargs):
+    """ the number of polls and when the list last changed, from one row per distinct opening hours """
+    windows = Poll.objects.values("start_time", "end_time").annotate(
+        count=Count("id"), last_updated=Max("last_updated")).order_by()
+    return {
+        "count": sum(window["count"] for window in windows),
+        "last_updated": max((
+            poll_modified(window["last_updated"], window["start_time"], window["end_time"])
+            for window in windows), default=None),
+    }
+
+
+def poll_list_modified(request, *args, **kwargs):
+    return poll_list_state(request)["last_updated"]
+
+
+def poll_list_etag(request, *args, **kwargs):
+    state = poll_list_state(request)
+    last_updated = state["last_updated"]
+    return (f"polls-{state['count']}-{last_updated.timestamp() if last_updated else 0}"
+            f"{representation(request)}")
+
+
+@cached_on_request
+def voter_detail_modified(request, pk, voter_pk, **kwargs):
+    row = Voter.objects.filter(pk=voter_pk, poll_id=pk).values_list(
+        "poll__last_updated", "poll__start_time", "poll__end_time").first()
+    return row and poll_modified(*row)
+
+
+def voter_detail_etag(request, pk, voter_pk, **kwargs):
+    modified = voter_detail_modified(request, pk, voter_pk)
+    return modified and f"voter-{voter_pk}-{modified.timestamp()}{representation(request)}"
@@ -0,0 +1,85 @@
+"""
+CSV and JSON Lines exports for auditors.
+
+Rows are read with ``iterator()`` a chunk at a time (a server-side cursor on
+PostgreSQL) and written out as they arrive, so an export holds about one
+chunk in memory however large the poll is.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from api.models import Poll, Vote, Voter
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def voter_rows(poll_id=None):
+    voters = Voter.objects.order_by("poll_id", "id")
+    if poll_id is not None:
+        voters = voters.filter(poll_id=poll_id)
+    return voters.values_list(
+        "id", "poll_id", "email", "first_name", "last_name", "phone_number",
+        "is_voted", "email_sent")
+
+
+def turnout_rows(poll_id=None):
+    polls = Poll.objects.order_by("id")
+    if poll_id is not None:
+        polls = polls.filter(id=poll_id)
+    return polls.annotate(
+        voters_count=Count("voters"),
+        voted=Count("voters", filter=Q(voters__is_voted=True)),
+        emailed=Count("voters", filter=Q(voters__email_sent=True)),
+    ).values_list("id", "name", "voters_count", "voted", "emailed")
+
+
+def ballot_rows(poll_id=None):
+    """ one row per vote with nothing that ties it to the voter, not even the order it was cast in """
+    votes = Vote.objects.order_by("poll_id", "candidate_id")
+    if poll_id is not None:
+        votes = votes.filter(poll_id=poll_id)
+    return votes.values_list("poll_id", "poll__name", "candidate_id", "candidate__name")
+
+
+EXPORTS = {
+    "voters": (voter_rows, [
+        "id", "poll", "email", "first_name", "last_name", "phone_number", "is_voted", "email_sent"]),
+    "turnout": (turnout_rows, ["poll", "poll_name", "voters", "voted", "emailed"]),
+    "ballots": (ballot_rows, ["poll", "poll_name", "candidate", "candidate_name"]),
+}
+
+
+class Echo:
+    """ a file-like object that hands back what is written to it """
+
+    def write(self, value):
+        return value
+
+
+def export_lines(dataset, file_format, poll_id=None, chunk_size=None):
+    """ yield the export a chunk of rows at a time, already encoded as text """
+    rows, columns = EXPORTS[dataset]
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        encode = writer.writerow
+    else:
+        def encode(row):
+            return json.dumps(dict(zip(columns, row)), default=str) + "\n"
+
+    chunk = []
+    for row in rows(poll_id).iterator(chunk_size=chunk_size):
+        chunk.append(encode(row))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
@@ -0,0 +1,174 @@
+"""
+Read-only serializers that work from ``values()`` rows instead of model
+instances. Each one mirrors a DRF serializer in ``api.serializers`` and must
+produce exactly the same output, which ``api.tests`` checks, and
+``manage.py bench_serializers`` measures the difference.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from phonenumber_field.phonenumber import to_python
+
+from api import cache as poll_cache
+from api.fieldsets import nested, trim
+from api.models import Candidate, Poll
+from api.registry import active_polls
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+@lru_cache(maxsize=65536)
+def phone_number(value):
+    """ the stored number as the model's descriptor and the serializer turn it out """
+    return str(to_python(value))
+
+
+class ValuesSerializer:
+    """
+    ``fields`` lists the output keys in order and ``converters`` turns a
+    non-null value into what the DRF field would output for it. Keys named in
+    ``extra_fields`` are not read from the row, ``add_extra`` computes them
+    for a whole page of rows at once, from the columns ``extra_columns``
+    names. ``expandable_fields`` are extra fields only output when they are
+    expanded, replacing the field of the same name if there is one.
+
+    ``values()`` and ``serialize()`` take the ``fields`` and ``expand`` trees
+    of ``api.fieldsets``, fields left out are neither read nor computed.
+    """
+    fields = []
+    extra_fields = ()
+    expandable_fields = ()
+    extra_columns = {}
+    converters = {}
+
+    @classmethod
+    def output_fields(cls, fields=None, expand=None):
+        """ the output keys in order, and the ones among them ``add_extra`` computes """
+        expanded = [field for field in cls.expandable_fields if expand and field in expand]
+        names = cls.fields + [field for field in expanded if field not in cls.fields]
+        names = [field for field in names if fields is None or field in fields]
+        extra = {field for field in names if field in cls.extra_fields or field in expanded}
+        return names, extra
+
+    @classmethod
+    def values(cls, queryset, fields=None, expand=None):
+        names, extra = cls.output_fields(fields, expand)
+        columns = ["id"]
+        for field in names:
+            for column in cls.extra_columns.get(field, ()) if field in extra else [field]:
+                if column not in columns:
+                    columns.append(column)
+        return queryset.values(*columns)
+
+    @classmethod
+    def serialize(cls, rows, fields=None, expand=None):
+        rows = list(rows)
+        names, extra = cls.output_fields(fields, expand)
+        computed = cls.add_extra(rows, extra, fields, expand or {}) if extra else {}
+        plan = [(field, cls.converters.get(field), computed.get(field)) for field in names]
+        data = []
+        for row in rows:
+            item = {}
+            for field, convert, values in plan:
+                if values is not None:
+                    item[field] = values[row["id"]]
+                    continue
+                value = row[field]
+                item[field] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+    @classmethod
+    def add_extra(cls, rows, names, fields, expand):
+        """
+        ``{field: {row id: value}}`` for the extra fields ``names``, nested
+        ones cut down to their branch of the ``fields`` and ``expand`` trees
+        """
+        return {}
+
+
+class PollListValues(ValuesSerializer):
+    """ ``PollListSerializer`` """
+    fields = ["id", "name", "description", "start_time", "end_time"]
+    expandable_fields = ("candidates", "is_active")
+    converters = {"start_time": isoformat, "end_time": isoformat}
+
+    @classmethod
+    def add_extra(cls, rows, names, fields, expand):
+        ids = [row["id"] for row in rows]
+        extra = {}
+        if "candidates" in names:
+            candidates = defaultdict(list)
+            # the same order ``poll.candidates.all()`` reads them in
+            for poll_id, name in Candidate.objects.filter(poll_id__in=ids).order_by("id").values_list(
+                    "poll_id", "name"):
+                candidates[poll_id].append(name)
+            extra["candidates"] = {poll_id: candidates[poll_id] for poll_id in ids}
+        if "is_active" in names:
+            open_ids = active_polls.open_ids()
+            extra["is_active"] = {poll_id: poll_id in open_ids for poll_id in ids}
+        return extra
+
+
+class PollDetailValues(PollListValues):
+    """ ``PollDetailSerializer`` """
+    fields = ["id", "name", "description", "end_time", "start_time", "candidates", "is_active"]
+    extra_fields = ("candidates", "is_active")
+    expandable_fields = ()
+
+
+def poll_detail(poll_id, fields=None):
+    """
+    ``PollDetailSerializer``'s output for the poll cut down to ``fields``, or
+    None if there is no such poll. It is the same for everyone who looks at
+    the poll, so it is built once and shared from the cache; only
+    ``is_active`` is read fresh since opening and closing doesn't invalidate
+    anything.
+    """
+    def compute():
+        data = PollDetailValues.serialize(PollDetailValues.values(Poll.objects.filter(pk=poll_id)))
+        return data[0] if data else None
+
+    data = poll_cache.get_or_compute(poll_id, poll_cache.DETAIL, compute)
+    return data and trim({**data, "is_active": active_polls.is_open(poll_id)}, fields)
+
+
+class VoterValues(ValuesSerializer):
+    """ ``VoterSerializer`` """
+    fields = ["id", "email", "first_name", "last_name", "phone_number", "is_voted",
+              "email_sent", "poll"]
+    expandable_fields = ("poll",)
+    extra_columns = {"poll": ["poll_id"]}
+    converters = {"id": str, "phone_number": phone_number}
+
+    @classmethod
+    def add_extra(cls, rows, names, fields, expand):
+        polls = list(PollListValues.values(
+            Poll.objects.filter(id__in={row["poll_id"] for row in rows}), nested(fields, "poll"),
+            expand.get("poll", {})))
+        data = PollListValues.serialize(polls, nested(fields, "poll"), expand.get("poll", {}))
+        polls = {poll["id"]: item for poll, item in zip(polls, data)}
+        return {"poll": {row["id"]: polls[row["poll_id"]] for row in rows}}
+
+
+class VoterDetailValues(ValuesSerializer):
+    """ ``VoterDetailSerializer``, with the nested poll taken from ``poll_detail()`` """
+    fields = ["id", "email", "full_name", "phone_number", "poll"]
+    extra_fields = ("full_name", "poll")
+    extra_columns = {"full_name": ["first_name", "last_name"], "poll": ["poll_id"]}
+    converters = {"id": str, "phone_number": phone_number}
+
+    @classmethod
+    def add_extra(cls, rows, names, fields, expand):
+        extra = {}
+        if "full_name" in names:
+            extra["full_name"] = {row["id"]: f"{row['first_name']} {row['last_name']}" for row in rows}
+        if "poll" in names:
+            polls = {
+                poll_id: poll_detail(poll_id, nested(fields, "poll"))
+                for poll_id in {row["poll_id"] for row in rows}
+            }
+            extra["poll"] = {row["id"]: polls[row["poll_id"]] for row in rows}
+        return extra
@@ -0,0 +1,96 @@
+"""
+Sparse fieldsets for API reads.
+
+``?fields=id,name`` cuts a response down to the listed fields and
+``?expand=poll`` adds the fields a serializer only renders on request, a
+related poll in full instead of its id for instance. Dotted names reach into
+nested objects, ``?fields=name,candidates.name``. Both are parsed into trees,
+``{"name": {}, "candidates": {"name": {}}}``, where an empty branch means
+the whole field.
+
+Fields left out are never computed, so the queries behind them don't run.
+Payloads served from the cache are built in full once and cut down with
+``trim()`` on the way out.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse(value):
+    """ ``"id,poll.name"`` as the tree ``{"id": {}, "poll": {"name": {}}}`` """
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def requested(request):
+    """
+    The request's ``fields`` and ``expand`` trees. ``fields`` is None when
+    the request doesn't restrict them, only reads are ever cut down.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, {}
+    fields = request.query_params.get("fields")
+    return parse(fields) if fields else None, parse(request.query_params.get("expand", ""))
+
+
+def nested(fields, name):
+    """ the part of the ``fields`` tree that applies inside the field ``name`` """
+    return (fields.get(name) or None) if fields is not None else None
+
+
+def trim(data, fields):
+    """ cut a payload that was built in full down to the ``fields`` tree """
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [trim(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {name: trim(value, fields[name] or None) for name, value in data.items() if name in fields}
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ``fields`` and ``expand``. The outermost serializer
+    takes the trees from the request, or from its ``fields`` and ``expand``
+    arguments, and hands each nested serializer its branch of them.
+    ``Meta.expandable_fields`` maps a name to the field class and arguments
+    it is rendered with once expanded, replacing the field of the same name
+    if there is one.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.fieldsets = (fields, expand or {}) if fields is not None or expand else None
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.fieldsets is None:
+            self.fieldsets = self.requested_fieldsets()
+        only, expand = self.fieldsets
+
+        for name, (field_class, kwargs) in getattr(self.Meta, "expandable_fields", {}).items():
+            if name in expand:
+                fields[name] = field_class(**kwargs)
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only}
+
+        for name, field in fields.items():
+            field = getattr(field, "child", field)
+            if isinstance(field, SparseFieldsMixin):
+                field.fieldsets = (nested(only, name), expand.get(name, {}))
+        return fields
+
+    def requested_fieldsets(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            # nested under a serializer that doesn't cut its fields down
+            return None, {}
+        return requested(self.context.get("request"))
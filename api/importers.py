@@ -0,0 +1,308 @@
+import codecs
+import csv
+import io
+import json
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from api.models import Voter, VoterImportJob
+from api.validation import VoterRowValidator
+
+# same wording as the email field's unique validator
+DUPLICATE_EMAIL_ERROR = "voter with this email address already exists."
+VOTER_COLUMNS = ['email', 'first_name', 'last_name', 'phone_number']
+
+
+def read_csv(file):
+    """ stream rows out of an uploaded csv file without reading it all into memory """
+    return csv.DictReader(codecs.iterdecode(file, "utf-8-sig"))
+
+
+class VoterImporter:
+    """
+    Import voter rows into a poll in batches.
+
+    Each batch is validated as a whole by ``VoterRowValidator`` (over
+    ``workers`` processes when there is more than one), checked for duplicate
+    emails with one query plus the set of emails already seen in this import,
+    and written with a single ``bulk_create``.
+
+    Each batch commits on its own, the bad rows are skipped and ``progress``
+    is called after every batch. Rejected rows are collected in ``errors``, or
+    handed to ``error_sink`` instead when one is given. ``created_sink`` is
+    told the id of every voter written, by row number.
+    """
+
+    def __init__(self, poll, batch_size=None, error_sink=None, progress=None,
+                 workers=None, created_sink=None):
+        self.poll = poll
+        self.batch_size = batch_size or settings.VOTER_IMPORT_BATCH_SIZE
+        self.error_sink = error_sink
+        self.progress = progress
+        self.created_sink = created_sink
+        self.validator = VoterRowValidator(workers)
+        self.seen_emails = set()
+        self.errors = []
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.seconds = 0
+
+    @property
+    def rows_per_sec(self):
+        return round(self.rows / self.seconds) if self.seconds else 0
+
+    def run(self, rows):
+        started = time.perf_counter()
+        try:
+            self.import_rows(rows)
+        finally:
+            self.validator.close()
+        self.seconds = time.perf_counter() - started
+        return self
+
+    def import_rows(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        self.finish()
+
+    def import_batch(self, rows):
+        first_row = self.rows + 1
+        self.rows += len(rows)
+        valid = []
+        results = self.validator(rows)
+        for number, row, (data, errors) in zip(range(first_row, self.rows + 1), rows, results):
+            if errors:
+                self.reject(row, errors, number)
+            else:
+                valid.append((number, row, data))
+
+        self.imported += self.write(list(self.filter_duplicates(valid)))
+        if self.progress:
+            self.progress(self)
+
+    def write(self, accepted):
+        """ insert the accepted (number, row, data) entries, returns how many were written """
+        voters = [Voter(**data, poll=self.poll) for number, row, data in accepted]
+        try:
+            with transaction.atomic():
+                Voter.objects.bulk_create(voters)
+        except IntegrityError:
+            # someone registered one of these emails since filter_duplicates
+            # looked, insert row by row so only the clashing rows are rejected
+            return self.write_rows(accepted)
+        if self.created_sink:
+            for (number, row, data), voter in zip(accepted, voters):
+                self.created_sink(number, voter.id)
+        return len(voters)
+
+    def write_rows(self, accepted):
+        """ insert each entry in its own savepoint, rejecting the ones that conflict """
+        written = 0
+        for number, row, data in accepted:
+            voter = Voter(**data, poll=self.poll)
+            try:
+                with transaction.atomic():
+                    voter.save(force_insert=True)
+            except IntegrityError:
+                self.reject(row, {'email': [DUPLICATE_EMAIL_ERROR]}, number)
+                continue
+            written += 1
+            if self.created_sink:
+                self.created_sink(number, voter.id)
+        return written
+
+    def finish(self):
+        """ called once every batch has been written """
+
+    def filter_duplicates(self, valid):
+        """ drop rows whose email is already registered or appeared earlier in the import """
+        emails = [data['email'] for number, row, data in valid]
+        registered = set(Voter.objects.filter(email__in=emails).values_list('email', flat=True))
+        for number, row, data in valid:
+            email = data['email']
+            if email in registered or email in self.seen_emails:
+                self.reject(row, {'email': [DUPLICATE_EMAIL_ERROR]}, number)
+                continue
+            self.seen_emails.add(email)
+            yield number, row, data
+
+    def reject(self, row, errors, number=None):
+        self.rejected += 1
+        if self.error_sink:
+            self.error_sink(number, row, errors)
+        else:
+            self.errors.append({'row': row, 'errors': errors})
+
+
+class CopyVoterImporter(VoterImporter):
+    """
+    PostgreSQL fast path that skips the ORM for the insert. Each batch's valid
+    rows are streamed with ``COPY FROM STDIN`` into an unlogged staging table,
+    and ``finish()`` merges the staging table into ``api_voter`` with a single
+    ``INSERT ... SELECT ... ON CONFLICT DO NOTHING``. Rows that conflict with
+    an existing voter are reported as duplicates, after ``created_sink`` has
+    already been told about them.
+    """
+    staged_columns = ['line', 'id', 'email', 'first_name', 'last_name', 'phone_number', 'poll_id']
+
+    def run(self, rows):
+        qn = connection.ops.quote_name
+        self.staging = qn(f"api_voter_import_{uuid.uuid4().hex}")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {self.staging} ("
+                "line integer, id uuid, email varchar(255), first_name varchar(255), "
+                "last_name varchar(255), phone_number varchar(128), poll_id bigint)")
+        try:
+            return super().run(rows)
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {self.staging}")
+
+    def filter_duplicates(self, valid):
+        """ only weed out repeats within the file, the merge catches registered emails """
+        for number, row, data in valid:
+            if data['email'] in self.seen_emails:
+                self.reject(row, {'email': [DUPLICATE_EMAIL_ERROR]}, number)
+                continue
+            self.seen_emails.add(data['email'])
+            yield number, row, data
+
+    def write(self, accepted):
+        phone_number = Voter._meta.get_field('phone_number')
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for number, row, data in accepted:
+            voter_id = uuid.uuid4()
+            writer.writerow([
+                number, voter_id, data['email'], data['first_name'], data['last_name'],
+                phone_number.get_prep_value(data.get('phone_number', '')), self.poll.pk,
+            ])
+            if self.created_sink:
+                self.created_sink(number, voter_id)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f"COPY {self.staging} ({', '.join(self.staged_columns)}) FROM STDIN WITH "
+                # an empty csv field is NULL to COPY unless told otherwise
+                f"(FORMAT csv, FORCE_NOT_NULL (email, first_name, last_name, phone_number))",
+                buffer)
+        return len(accepted)
+
+    def finish(self):
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(Voter._meta.get_field(name).column) for name in [
+            'id', 'email', 'first_name', 'last_name', 'phone_number', 'poll', 'is_voted', 'email_sent'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH inserted AS ("
+                f" INSERT INTO {qn(Voter._meta.db_table)} ({columns})"
+                f" SELECT id, email, first_name, last_name, phone_number, poll_id, false, false"
+                f" FROM {self.staging} ORDER BY line"
+                f" ON CONFLICT DO NOTHING RETURNING id"
+                f") SELECT line, email, first_name, last_name, phone_number FROM {self.staging} staged"
+                f" WHERE NOT EXISTS (SELECT 1 FROM inserted WHERE inserted.id = staged.id)"
+                f" ORDER BY line")
+            for number, *values in cursor:
+                self.imported -= 1
+                self.reject(dict(zip(VOTER_COLUMNS, values)), {'email': [DUPLICATE_EMAIL_ERROR]}, number)
+        if self.progress:
+            self.progress(self)
+
+
+def get_importer(poll, **kwargs):
+    """ the COPY importer on PostgreSQL when enabled, the ORM batching importer otherwise """
+    if connection.vendor == "postgresql" and settings.VOTER_IMPORT_USE_COPY:
+        return CopyVoterImporter(poll, **kwargs)
+    return VoterImporter(poll, **kwargs)
+
+
+def register_voters(poll, items):
+    """
+    Register a list of voter objects in the poll, keeping the valid ones.
+    Returns the importer and one result per item in order: the new voter's
+    id, or the errors that kept it out.
+    """
+    results = [None] * len(items)
+
+    def created(number, voter_id):
+        results[number - 1] = {"index": number - 1, "id": voter_id}
+
+    def rejected(number, row, errors):
+        results[number - 1] = {"index": number - 1, "errors": errors}
+
+    importer = get_importer(poll, error_sink=rejected, created_sink=created)
+    importer.run(items)
+    return importer, results
+
+
+class ErrorReport:
+    """ rejected rows written to a temporary csv as they come, instead of held in memory """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(mode="w+", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['row'] + VOTER_COLUMNS + ['errors'])
+
+    def __call__(self, number, row, errors):
+        row = row or {}
+        self.writer.writerow(
+            [number] + [row.get(column, '') for column in VOTER_COLUMNS] + [json.dumps(errors)])
+
+    def close(self):
+        self.file.close()
+
+
+def run_import_job(job):
+    """ import a job's uploaded register, keeping the good rows and reporting the rest """
+    VoterImportJob.objects.filter(pk=job.pk).update(status=VoterImportJob.RUNNING)
+
+    def progress(importer):
+        VoterImportJob.objects.filter(pk=job.pk).update(
+            rows_processed=importer.rows, rows_accepted=importer.imported,
+            rows_rejected=importer.rejected)
+
+    report = ErrorReport()
+    try:
+        with job.file.open("rb") as file:
+            importer = get_importer(job.poll, error_sink=report, progress=progress)
+            importer.run(read_csv(file))
+
+        job.rows_processed = importer.rows
+        job.rows_accepted = importer.imported
+        job.rows_rejected = importer.rejected
+        job.rows_per_sec = importer.rows_per_sec
+        if importer.rejected:
+            report.file.seek(0)
+            job.error_report.save(f"{job.pk}.csv", File(report.file), save=False)
+        job.status = VoterImportJob.FINISHED
+    except (UnicodeDecodeError, csv.Error) as e:
+        job.status = VoterImportJob.FAILED
+        job.error = str(e)
+    except Exception as e:
+        # anything else is a bug or the database going away, record it and let celery see it too;
+        # the row counts are left as the last progress update wrote them
+        job.status = VoterImportJob.FAILED
+        job.error = str(e) or e.__class__.__name__
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at"])
+        raise
+    finally:
+        report.close()
+
+    job.finished_at = timezone.now()
+    job.save()
+    return job
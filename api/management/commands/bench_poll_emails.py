@@ -0,0 +1,52 @@
+import time
+import uuid
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Poll, Voter
+from api.utils import PollEmailDispatcher
+
+
+class Command(BaseCommand):
+    help = "Measure poll email throughput against the locmem backend or a local SMTP stand-in"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--voters", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--backend", default="django.core.mail.backends.locmem.EmailBackend",
+                            help="mail backend to send through, e.g. the smtp backend pointed "
+                                 "at `python -m aiosmtpd -n`")
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument("--port", type=int, default=8025)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        poll = Poll.objects.create(name=f"bench-{suffix}")
+        Voter.objects.bulk_create([
+            Voter(email=f"bench-{suffix}-{i}@example.com", first_name="Bench",
+                  last_name=str(i), poll=poll)
+            for i in range(options["voters"])
+        ])
+
+        kwargs = {}
+        if options["backend"].endswith("smtp.EmailBackend"):
+            kwargs = {"host": options["host"], "port": options["port"],
+                      "username": "", "password": "", "use_tls": False, "use_ssl": False}
+        mail.outbox = []
+        dispatcher = PollEmailDispatcher(
+            "bench.example.com", batch_size=options["batch_size"],
+            connection=mail.get_connection(options["backend"], **kwargs))
+        try:
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                dispatcher.send(Voter.objects.filter(poll=poll))
+            seconds = time.perf_counter() - started
+        finally:
+            poll.delete()
+
+        self.stdout.write(
+            f"{dispatcher.sent} sent, {dispatcher.failed} failed in {seconds:.2f}s "
+            f"({round(dispatcher.sent / seconds)} emails/sec, {len(queries)} queries)")
@@ -0,0 +1,51 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api import serializers
+from api.fastserializers import VoterValues
+from api.models import Poll, Voter
+from api.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = "Compare the per-row cost of the values() serializers and DRF's on pages of voters"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                            help="page sizes to time")
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        poll = Poll.objects.create(name=f"bench-{suffix}", description="bench   poll")
+        Voter.objects.bulk_create([
+            Voter(email=f"bench-{suffix}-{i}@example.com", first_name="Bench", last_name=str(i),
+                  phone_number="+2348031234567" if i % 2 else "", poll=poll)
+            for i in range(max(options["rows"]))
+        ], batch_size=5000)
+        try:
+            for rows in options["rows"]:
+                self.compare(Voter.objects.filter(poll=poll).order_by("id")[:rows], rows)
+        finally:
+            poll.delete()
+
+    def compare(self, queryset, rows):
+        self.stdout.write(f"{rows} rows")
+        started = time.perf_counter()
+        data = serializers.VoterSerializer(queryset, many=True).data
+        serialized = time.perf_counter()
+        JSONRenderer().render(data)
+        self.report("model serializer + JSONRenderer", rows, started, serialized, time.perf_counter())
+
+        started = time.perf_counter()
+        data = VoterValues.serialize(VoterValues.values(queryset))
+        serialized = time.perf_counter()
+        ORJSONRenderer().render(data)
+        self.report("values() + ORJSONRenderer", rows, started, serialized, time.perf_counter())
+
+    def report(self, label, rows, started, serialized, rendered):
+        self.stdout.write(
+            f"  {label:>32}: {(serialized - started) / rows * 1e6:.1f}us/row to serialize, "
+            f"{(rendered - serialized) / rows * 1e6:.1f}us/row to render")
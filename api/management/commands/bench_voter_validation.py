@@ -0,0 +1,67 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.serializers import VoterImportSerializer
+from api.validation import VoterRowValidator
+
+DOMAINS = ["gmail.com", "yahoo.com", "example.com", "mail.example.ng", "bad_domain", ""]
+PHONE_FORMATS = ["0803{}", "+234803{}", "0803 {} ", "(0803) {}", "0803-{}", "12{}", "", "not a number"]
+
+
+def make_row(n):
+    """ a register row, mostly valid with a sprinkling of the usual mistakes """
+    digits = f"{random.randrange(10 ** 7):07d}"
+    return {
+        'email': f"voter{n}@{random.choice(DOMAINS)}" if random.random() < 0.1 else f"voter{n}@gmail.com",
+        'first_name': random.choice(["Ada", "Tunde", " Ngozi ", "", "x" * 300]) if random.random() < 0.1 else "Ada",
+        'last_name': f"Voter{n}",
+        'phone_number': random.choice(PHONE_FORMATS).format(digits),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare batch voter row validation against running the serializer for every row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000)
+        parser.add_argument("--workers", type=int, default=4,
+                            help="processes for the pooled run")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        rows = [make_row(n) for n in range(options["rows"])]
+        chunks = [rows[start:start + options["chunk_size"]]
+                  for start in range(0, len(rows), options["chunk_size"])]
+
+        started = time.perf_counter()
+        expected = []
+        for row in rows:
+            serializer = VoterImportSerializer(data=row)
+            if serializer.is_valid():
+                expected.append((dict(serializer.validated_data), None))
+            else:
+                expected.append((None, serializer.errors))
+        self.report("serializer per row", len(rows), time.perf_counter() - started)
+
+        for label, workers in [("batch", 0), (f"batch, {options['workers']} processes", options["workers"])]:
+            validator = VoterRowValidator(workers)
+            try:
+                started = time.perf_counter()
+                results = [result for chunk in chunks for result in validator(chunk)]
+                self.report(label, len(rows), time.perf_counter() - started)
+            finally:
+                validator.close()
+
+            mismatches = sum(result != outcome for result, outcome in zip(results, expected))
+            if mismatches:
+                self.stdout.write(self.style.ERROR(
+                    f"  {mismatches} rows validated differently from the serializer"))
+
+        rejected = sum(errors is not None for data, errors in expected)
+        self.stdout.write(f"{rejected} of {len(rows)} rows rejected")
+
+    def report(self, label, rows, seconds):
+        self.stdout.write(f"{label:>24}: {seconds:.2f}s, {round(rows / seconds)} rows/sec")
@@ -0,0 +1,77 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from api.models import Candidate, Poll, Vote, Voter
+from api.services import AlreadyVoted, cast_vote
+
+
+class Command(BaseCommand):
+    help = "Hammer the vote path with parallel clients and check that no voter votes twice"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--voters", type=int, default=500)
+        parser.add_argument("--clients", type=int, default=8,
+                            help="number of parallel clients")
+        parser.add_argument("--attempts", type=int, default=3,
+                            help="ballots submitted per voter")
+        parser.add_argument("--candidates", type=int, default=3)
+
+    def handle(self, *args, **options):
+        suffix = uuid.uuid4().hex[:8]
+        poll = Poll.objects.create(name=f"bench-{suffix}")
+        candidates = Candidate.objects.bulk_create([
+            Candidate(name=f"bench-{suffix}-{i}", poll=poll)
+            for i in range(options["candidates"])
+        ])
+        voters = Voter.objects.bulk_create([
+            Voter(email=f"bench-{suffix}-{i}@example.com", first_name="Bench",
+                  last_name=str(i), poll=poll)
+            for i in range(options["voters"])
+        ])
+
+        # every voter gets ``attempts`` ballots, interleaved so duplicates race
+        ballots = [
+            (voter.id, candidates[n % len(candidates)].id)
+            for n in range(options["attempts"])
+            for voter in voters
+        ]
+        outcomes = {"accepted": 0, "rejected": 0, "errors": 0}
+
+        def submit(ballot):
+            voter_id, candidate_id = ballot
+            try:
+                cast_vote(poll.id, voter_id, candidate_id)
+                return "accepted"
+            except AlreadyVoted:
+                return "rejected"
+            except Exception:
+                return "errors"
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["clients"]) as pool:
+                for outcome in pool.map(submit, ballots):
+                    outcomes[outcome] += 1
+            elapsed = time.perf_counter() - started
+
+            doubles = (Vote.objects.filter(poll=poll).values("voted_by")
+                       .annotate(n=Count("id")).filter(n__gt=1).count())
+            self.stdout.write(
+                f"{len(ballots)} ballots from {options['clients']} clients in {elapsed:.2f}s "
+                f"({len(ballots) / elapsed:.0f} ballots/sec)")
+            self.stdout.write(
+                f"accepted={outcomes['accepted']} rejected={outcomes['rejected']} "
+                f"errors={outcomes['errors']} votes={Vote.objects.filter(poll=poll).count()}")
+            if doubles:
+                self.stderr.write(self.style.ERROR(f"{doubles} voters voted more than once"))
+            else:
+                self.stdout.write(self.style.SUCCESS("no double votes"))
+        finally:
+            poll.delete()
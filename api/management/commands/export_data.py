@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.exports import EXPORTS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream voters, turnout or anonymized ballots to a csv or json lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--poll", type=int, help="only export this poll")
+        parser.add_argument("--output", help="file to write, standard output by default")
+        parser.add_argument("--chunk-size", type=int)
+
+    def handle(self, *args, **options):
+        lines = export_lines(options["dataset"], options["format"], options["poll"],
+                             options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as output:
+                output.writelines(lines)
+        else:
+            for chunk in lines:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.models import CandidateTally
+from api.services import rebuild_tallies
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-candidate tally table from the Vote table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("polls", nargs="*", type=int,
+                            help="poll ids to rebuild, defaults to every poll")
+
+    def handle(self, *args, **options):
+        polls = options["polls"] or None
+        rebuild_tallies(polls)
+        tallies = CandidateTally.objects.all()
+        if polls:
+            tallies = tallies.filter(poll_id__in=polls)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {tallies.count()} candidate tallies"))
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_votes(apps, schema_editor):
+    Vote = apps.get_model("api", "Vote")
+    CandidateTally = apps.get_model("api", "CandidateTally")
+    counts = (
+        Vote.objects.values("poll_id", "candidate_id")
+        .annotate(total=models.Count("id"))
+        .order_by()
+    )
+    CandidateTally.objects.bulk_create(
+        [
+            CandidateTally(
+                poll_id=row["poll_id"],
+                candidate_id=row["candidate_id"],
+                stripe=0,
+                count=row["total"],
+            )
+            for row in counts
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CandidateTally",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("stripe", models.PositiveSmallIntegerField(default=0)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tallies",
+                        to="api.candidate",
+                    ),
+                ),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tallies",
+                        to="api.poll",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("candidate", "stripe")},
+            },
+        ),
+        migrations.RunPython(count_existing_votes, migrations.RunPython.noop),
+    ]
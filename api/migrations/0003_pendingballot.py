@@ -0,0 +1,53 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_candidatetally"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingBallot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "candidate",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_ballots",
+                        to="api.candidate",
+                    ),
+                ),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_ballots",
+                        to="api.poll",
+                    ),
+                ),
+                (
+                    "voted_by",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_ballot",
+                        to="api.voter",
+                    ),
+                ),
+            ],
+        ),
+    ]
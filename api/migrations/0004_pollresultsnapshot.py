@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_pendingballot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PollResultSnapshot",
+            fields=[
+                (
+                    "poll",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="result_snapshot",
+                        serialize=False,
+                        to="api.poll",
+                    ),
+                ),
+                ("body", models.TextField()),
+                ("etag", models.CharField(max_length=64)),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("built_at", models.DateTimeField()),
+            ],
+        ),
+    ]
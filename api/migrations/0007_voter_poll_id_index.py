@@ -0,0 +1,19 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_pollemail"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="voter",
+            index=models.Index(
+                fields=["poll", "id"], name="api_voter_poll_id_c3a492_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_voter_poll_id_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BallotFlush",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("finished_at", models.DateTimeField()),
+                ("duration_ms", models.FloatField()),
+                ("batches", models.PositiveIntegerField()),
+                ("votes_written", models.PositiveIntegerField()),
+                ("ballots_dropped", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
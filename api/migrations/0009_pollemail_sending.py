@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_ballotflush"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pollemail",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
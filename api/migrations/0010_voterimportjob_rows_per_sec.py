@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_pollemail_sending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="voterimportjob",
+            name="rows_per_sec",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -2,26 +2,33 @@ import datetime
 import uuid
 
 from django.db import models
-from django.db.models import Q
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import Coalesce, Rank
 from django.conf import settings
 from django.db.models.query import QuerySet
+from django.utils import timezone
 from django.urls import reverse
 from phonenumber_field.modelfields import PhoneNumberField
 
 from accounts.models import User
-
-now = datetime.datetime.now()
+from api.registry import active_polls
 
 # Create your models here.
 
 class PollObjects(models.Manager):
         def get_queryset(self) -> QuerySet:
             return super().get_queryset().filter(
-                Q(start_time__lte=now) & Q(
-                    end_time__gte=now) & Q(is_deleted=False)
+                Q(id__in=active_polls.open_ids()) & Q(is_deleted=False)
             )
 
-class Poll(models.Model):    
+class PollQuerySet(models.QuerySet):
+
+    def with_results(self):
+        """ prefetch candidates with their vote counts, enough to render results in memory """
+        return self.prefetch_related(candidate_results_prefetch())
+
+
+class Poll(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(null=True)
     start_time = models.TimeField(
@@ -31,7 +38,7 @@ class Poll(models.Model):
     is_deleted = models.BooleanField(default=False)
     last_updated = models.DateTimeField(auto_now=True)
 
-    objects = models.Manager()  # default manager
+    objects = PollQuerySet.as_manager()  # default manager
     pollobjects = PollObjects()  # custom manager
 
     def __str__(self):
@@ -40,13 +47,31 @@ class Poll(models.Model):
     @property
     def is_active(self):
         """ check if poll is active at current time """
-        return self.start_time <= datetime.datetime.now().time() <= self.end_time
+        if self.pk is None:
+            return self.start_time <= timezone.localtime().time() <= self.end_time
+        return active_polls.is_open(self.pk)
 
     def get_absolute_url(self):
         return reverse("poll_detail", kwargs={"pk": self.pk})
 
     def get_total_vote(self):
-        return self.poll_votes.count()
+        return self.tallies.aggregate(total=Sum("count"))["total"] or 0
+
+
+class CandidateQuerySet(models.QuerySet):
+
+    def with_vote_count(self):
+        return self.annotate(vote_count=Coalesce(Sum("tallies__count"), 0))
+
+    def winners(self):
+        """
+        Leading candidate(s) of every live poll with votes, in a single query.
+        ``tied_with`` is the number of candidates sharing the lead.
+        """
+        return self.filter(poll__isnull=False, poll__is_deleted=False).with_vote_count().annotate(
+            rank=Window(Rank(), partition_by=F("poll_id"), order_by=F("vote_count").desc()),
+            tied_with=Window(Count("id"), partition_by=[F("poll_id"), F("vote_count")]),
+        ).filter(rank=1, vote_count__gt=0)
 
 
 class Candidate(models.Model):
@@ -55,6 +80,8 @@ class Candidate(models.Model):
     poll = models.ForeignKey(
         Poll, on_delete=models.CASCADE, null=True, related_name="candidates")
 
+    objects = CandidateQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -62,7 +89,12 @@ class Candidate(models.Model):
         return reverse("candidate_detail", kwargs={"pk": self.pk})
 
     def get_vote_count(self):
-        return self.candidate_votes.count()
+        return self.tallies.aggregate(total=Sum("count"))["total"] or 0
+
+
+def candidate_results_prefetch():
+    return models.Prefetch(
+        "candidates", queryset=Candidate.objects.with_vote_count().order_by("id"))
 
 
 class Voter(models.Model):
@@ -76,6 +108,10 @@ class Voter(models.Model):
     is_voted = models.BooleanField(default=False)
     email_sent = models.BooleanField(default=False)
 
+    class Meta:
+        # a poll's voters are paged through in id order
+        indexes = [models.Index(fields=["poll", "id"])]
+
     def __str__(self):
         return self.email
 
@@ -83,11 +119,12 @@ class Voter(models.Model):
         return f'{self.first_name} {self.last_name}'
 
     def cast_vote(self):
-        if not self.is_voted:
+        """ mark the voter as voted, only succeeds for the first caller """
+        updated = Voter.objects.filter(
+            pk=self.pk, is_voted=False).update(is_voted=True)
+        if updated:
             self.is_voted = True
-            self.save()
-            return True
-        return False
+        return bool(updated)
     
 
 class Vote(models.Model):
@@ -99,3 +136,149 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ("poll", "voted_by")
+
+
+class CandidateTally(models.Model):
+    """
+    Running vote count for a candidate, kept up to date by the vote path.
+    Each candidate's count is split across ``settings.VOTE_TALLY_STRIPES`` rows
+    so concurrent ballots don't all queue on the same row lock.
+    """
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="tallies")
+    candidate = models.ForeignKey(
+        Candidate, on_delete=models.CASCADE, related_name="tallies")
+    stripe = models.PositiveSmallIntegerField(default=0)
+    # a single stripe may dip below zero after a vote is deleted, only the sum matters
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("candidate", "stripe")
+
+    def __str__(self):
+        return f"{self.candidate} #{self.stripe}: {self.count}"
+
+
+class PendingBallot(models.Model):
+    """ ballot accepted in queued ingestion mode, waiting to be written out as a Vote """
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="pending_ballots")
+    candidate = models.ForeignKey(
+        Candidate, on_delete=models.CASCADE, related_name="pending_ballots")
+    voted_by = models.OneToOneField(
+        Voter, on_delete=models.CASCADE, related_name="pending_ballot")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.voted_by} -> {self.candidate}"
+
+
+class BallotFlush(models.Model):
+    """
+    Stats of the last run of ``flush_pending_ballots``, a single row. It is
+    kept in the database because the flush runs in a celery worker and the
+    ballot queue metrics are read by the web processes.
+    """
+    finished_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    batches = models.PositiveIntegerField()
+    votes_written = models.PositiveIntegerField()
+    # ballots whose vote couldn't be inserted, dropped so they don't block the queue
+    ballots_dropped = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"flush @ {self.finished_at}: {self.votes_written} votes"
+
+
+class PollResultSnapshot(models.Model):
+    """
+    Rendered result of a closed poll. It is served as stored, with ``etag``
+    as its validator, until the poll opens again or an admin edits it.
+    """
+    poll = models.OneToOneField(
+        Poll, on_delete=models.CASCADE, primary_key=True, related_name="result_snapshot")
+    body = models.TextField()
+    etag = models.CharField(max_length=64)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.poll_id} result @ {self.built_at}"
+
+    def is_current(self):
+        """ the poll is closed and nothing can have changed since it last closed """
+        if active_polls.is_open(self.poll_id):
+            return False
+        now = timezone.localtime()
+        closed_on = now.date()
+        if now.time() < self.end_time:
+            closed_on -= datetime.timedelta(days=1)
+        last_closed = timezone.make_aware(
+            datetime.datetime.combine(closed_on, self.end_time))
+        return self.built_at >= last_closed
+
+
+class VoterImportJob(models.Model):
+    """ a csv voter register being imported in the background """
+    PENDING = "pending"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (FINISHED, "Finished"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="import_jobs")
+    file = models.FileField(upload_to="imports/")
+    error_report = models.FileField(upload_to="imports/errors/", blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_accepted = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    # throughput of the finished import
+    rows_per_sec = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.file.name} -> {self.poll} ({self.status})"
+
+
+class PollEmail(models.Model):
+    """ a voter's poll invitation waiting in the outbox, or the record of its delivery """
+    PENDING = "pending"
+    # claimed by a drain until next_attempt_at, due again if the drain never finishes it
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    voter = models.OneToOneField(
+        Voter, on_delete=models.CASCADE, related_name="poll_email")
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="poll_emails")
+    site = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.voter} ({self.status})"
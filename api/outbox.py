@@ -0,0 +1,192 @@
+"""
+Outbox for poll invitation emails.
+
+``queue_poll_emails`` records a ``PollEmail`` for every voter of a poll who has
+not been emailed yet, and ``drain_outbox`` sends them from a Celery worker
+under a token-bucket rate limit. A failed email is tried again after an
+exponentially growing delay until ``POLL_EMAIL_MAX_ATTEMPTS`` is reached.
+
+A drain claims the emails it sends in the database, so two drains never send
+the same email. The drain lock that keeps the rate limit global lives in the
+cache and only holds across workers when they share it.
+"""
+import datetime
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api.models import PollEmail, Voter
+from api.utils import PollEmailDispatcher
+
+DRAIN_LOCK_KEY = "poll-emails:draining"
+DRAIN_SCHEDULED_KEY = "poll-emails:drain-scheduled"
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` sends a second on average with bursts of up to
+    ``capacity``. ``take`` blocks until enough tokens have built up.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+
+    def take(self, count=1):
+        count = min(count, self.capacity)
+        while True:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= count:
+                self.tokens -= count
+                return count
+            self.sleep((count - self.tokens) / self.rate)
+
+
+def retry_delay(attempts):
+    """ seconds to wait before trying an email again after ``attempts`` failures """
+    return min(settings.POLL_EMAIL_RETRY_DELAY * 2 ** (attempts - 1), settings.POLL_EMAIL_MAX_RETRY_DELAY)
+
+
+def queue_poll_emails(poll_id, site):
+    """
+    Put every voter of the poll with ``email_sent=False`` in the outbox and
+    return how many were added. Voters already waiting are left alone, so
+    triggering a poll's emails again never sends anyone a second email.
+    """
+    now = timezone.now()
+    # voters whose earlier email failed for good, or who were reset to be emailed again
+    requeued = PollEmail.objects.filter(poll_id=poll_id, voter__email_sent=False).exclude(
+        status__in=[PollEmail.PENDING, PollEmail.SENDING]).update(
+            status=PollEmail.PENDING, site=site, attempts=0, next_attempt_at=now, last_error="")
+
+    voter_ids = Voter.objects.filter(
+        poll_id=poll_id, email_sent=False, poll_email__isnull=True).values_list("id", flat=True)
+    queued = 0
+    emails = []
+    for voter_id in voter_ids.iterator(chunk_size=settings.POLL_EMAIL_BATCH_SIZE):
+        emails.append(PollEmail(voter_id=voter_id, poll_id=poll_id, site=site, next_attempt_at=now))
+        if len(emails) >= settings.POLL_EMAIL_BATCH_SIZE:
+            queued += len(PollEmail.objects.bulk_create(emails, ignore_conflicts=True))
+            emails = []
+    if emails:
+        queued += len(PollEmail.objects.bulk_create(emails, ignore_conflicts=True))
+
+    if queued or requeued:
+        schedule_outbox_drain()
+    return queued + requeued
+
+
+def schedule_outbox_drain(countdown=0):
+    """ schedule a drain unless one is already waiting to run """
+    from api.tasks import drain_poll_emails
+
+    if cache.add(DRAIN_SCHEDULED_KEY, True, timeout=countdown + 60):
+        transaction.on_commit(lambda: drain_poll_emails.apply_async(countdown=countdown))
+
+
+def drain_outbox(time_limit=None):
+    """
+    Send the outbox's due emails until none are left or ``time_limit`` seconds
+    have passed, returns the number sent. One drain runs at a time so the
+    rate limit holds across workers. A drain that runs out of time schedules
+    the next one, retries that fall due later are picked up by the drain the
+    beat schedule runs every minute.
+    """
+    time_limit = time_limit or settings.POLL_EMAIL_DRAIN_SECONDS
+    lease = time_limit + 60
+    if not cache.add(DRAIN_LOCK_KEY, True, timeout=lease):
+        return 0
+
+    sent = 0
+    emails = []
+    out_of_time = False
+    try:
+        bucket = TokenBucket(settings.POLL_EMAIL_RATE_LIMIT, settings.POLL_EMAIL_BURST)
+        batch_size = min(settings.POLL_EMAIL_BATCH_SIZE, settings.POLL_EMAIL_BURST)
+        connection = get_connection()
+        dispatchers = {}
+        deadline = time.monotonic() + time_limit
+        emails = claim_emails(batch_size, lease)
+        # only connect to the mail server when there is something to send
+        with connection if emails else nullcontext():
+            while emails:
+                bucket.take(len(emails))
+                for site in {email.site for email in emails}:
+                    if site not in dispatchers:
+                        dispatchers[site] = PollEmailDispatcher(site, connection=connection)
+                    sent += send_outbox_batch(
+                        dispatchers[site], [email for email in emails if email.site == site])
+                emails = []
+                out_of_time = time.monotonic() >= deadline
+                if out_of_time:
+                    break
+                emails = claim_emails(batch_size, lease)
+    finally:
+        cache.delete(DRAIN_LOCK_KEY)
+        # hand back the emails claimed but never sent, instead of holding them until the lease runs out
+        PollEmail.objects.filter(
+            id__in=[email.id for email in emails], status=PollEmail.SENDING,
+        ).update(status=PollEmail.PENDING, next_attempt_at=timezone.now())
+
+    if out_of_time:
+        schedule_outbox_drain()
+    return sent
+
+
+def claim_emails(limit, lease):
+    """
+    Claim up to ``limit`` due emails and return them. The rows are locked
+    with SKIP LOCKED, so a concurrent drain passes over them, and marked
+    ``sending`` for ``lease`` seconds. An email whose drain died comes due
+    again when its claim runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(PollEmail.objects.select_for_update(skip_locked=True, of=("self",)).filter(
+            status__in=[PollEmail.PENDING, PollEmail.SENDING], next_attempt_at__lte=now,
+        ).select_related("voter").order_by("next_attempt_at", "id")[:limit])
+        PollEmail.objects.filter(id__in=[email.id for email in emails]).update(
+            status=PollEmail.SENDING, next_attempt_at=now + datetime.timedelta(seconds=lease))
+    return emails
+
+
+def send_outbox_batch(dispatcher, emails):
+    delivered, errors = dispatcher.deliver([email.voter for email in emails])
+    now = timezone.now()
+    delivered_ids = [voter.id for voter in delivered]
+    with transaction.atomic():
+        PollEmail.objects.filter(voter_id__in=delivered_ids).update(
+            status=PollEmail.SENT, sent_at=now, last_error="")
+        Voter.objects.filter(id__in=delivered_ids).update(email_sent=True)
+
+        failed = [email for email in emails if email.voter_id in errors]
+        for email in failed:
+            email.attempts += 1
+            email.last_error = errors[email.voter_id]
+            if email.attempts >= settings.POLL_EMAIL_MAX_ATTEMPTS:
+                email.status = PollEmail.FAILED
+            else:
+                email.status = PollEmail.PENDING
+                email.next_attempt_at = now + datetime.timedelta(seconds=retry_delay(email.attempts))
+        PollEmail.objects.bulk_update(failed, ["attempts", "last_error", "status", "next_attempt_at"])
+    return len(delivered)
+
+
+def get_outbox_counts(poll_id):
+    """ how many of the poll's emails are pending, being sent, sent and failed """
+    counts = dict.fromkeys([PollEmail.PENDING, PollEmail.SENDING, PollEmail.SENT, PollEmail.FAILED], 0)
+    counts.update(PollEmail.objects.filter(poll_id=poll_id).order_by().values("status").annotate(
+        count=Count("id")).values_list("status", "count"))
+    return counts
@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class DefaultPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key. Each page is one index range scan
+    starting after the cursor, so it costs the same however deep it is.
+    """
+    ordering = ("id",)
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_pubsub = None
+
+
+class Subscription:
+    """ messages for one subscriber, read with ``async for`` on the loop that subscribed """
+
+    def __init__(self, pubsub, channel, max_pending):
+        self.pubsub = pubsub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # a subscriber that can't keep up is cut off, it gets a fresh snapshot on reconnect
+            self.overflowed = True
+            self.close()
+
+    def close(self):
+        self.pubsub.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.overflowed:
+            raise StopAsyncIteration
+        return await self.queue.get()
+
+
+class LocalPubSub:
+    """
+    In-process publish/subscribe. A message published once is handed to every
+    subscriber of its channel, from any thread. Only subscribers in this process
+    see it, so it only serves a single ASGI process with votes written in that
+    process; ``api.checks`` rejects it for anything else.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_pending)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        return self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        """ hand the message to this process's subscribers of the channel """
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # the subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+class RedisPubSub(LocalPubSub):
+    """
+    Publish/subscribe across processes through Redis. ``publish`` sends the
+    message to Redis from whichever process wrote the vote, the celery worker
+    included. A process with subscribers runs one listener thread, started
+    with the first subscription, that follows every poll channel and hands
+    what arrives to its local subscribers.
+    """
+
+    def __init__(self, url=None, max_pending=1000):
+        import redis
+
+        super().__init__(max_pending)
+        self.redis = redis.Redis.from_url(url or settings.RESULTS_PUBSUB_URL)
+        self._listener = None
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._listener is None:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{CHANNEL_PATTERN: self.receive})
+                self._listener = pubsub.run_in_thread(
+                    sleep_time=1, daemon=True, exception_handler=self.listener_failed)
+        return super().subscribe(channel)
+
+    def publish(self, channel, message):
+        return self.redis.publish(channel, json.dumps(message))
+
+    def receive(self, message):
+        self.deliver(message["channel"].decode(), json.loads(message["data"]))
+
+    @staticmethod
+    def listener_failed(error, pubsub, thread):
+        # the next read reconnects and subscribes again, don't spin while redis is away
+        logger.warning("Lost the results pub/sub connection, retrying: %s", error)
+        time.sleep(1)
+
+
+def get_pubsub():
+    """ the process-wide pub/sub backend named by ``settings.RESULTS_PUBSUB_BACKEND`` """
+    global _pubsub
+    if _pubsub is None:
+        _pubsub = import_string(settings.RESULTS_PUBSUB_BACKEND)()
+    return _pubsub
+
+
+def poll_channel(poll_id):
+    return f"poll:{poll_id}:tally"
+
+
+# every poll's channel
+CHANNEL_PATTERN = poll_channel("*")
@@ -0,0 +1,185 @@
+import datetime
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+VERSION_KEY = "polls:registry-version"
+# seconds a process goes on trusting the version it last read from the shared cache
+VERSION_CHECK_INTERVAL = 1
+
+
+class ActivePollRegistry:
+    """
+    Ids of the polls open right now, held in process memory.
+
+    The set is recomputed with one query the first time it is read after a
+    poll's start or end time passes, or after any poll is saved or deleted
+    (``invalidate()`` bumps a version kept in the shared cache once the change
+    commits, so other processes notice too). Every other read is answered
+    from memory, the shared version included: it is read at most once every
+    ``VERSION_CHECK_INTERVAL`` seconds, so other processes' changes show up
+    within that interval and this process's own changes at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = frozenset()
+        self._next_boundary = None
+        self._version = None
+        self._seen_version = None
+        self._version_checked_at = None
+
+    def is_open(self, poll_id):
+        return poll_id in self.open_ids()
+
+    def open_ids(self):
+        now = timezone.localtime()
+        version = self._shared_version()
+        if self._is_stale(now, version):
+            with self._lock:
+                if self._is_stale(now, version):
+                    self._refresh(now, version)
+        return self._open
+
+    def invalidate(self):
+        self._forget()
+        # bumped any earlier, another process could read the old poll times and
+        # keep them under the new version until the next boundary
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        self._forget()
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+    def _forget(self):
+        with self._lock:
+            self._next_boundary = None
+            self._version_checked_at = None
+
+    def _shared_version(self):
+        checked_at = time.monotonic()
+        if (self._version_checked_at is None
+                or checked_at - self._version_checked_at >= VERSION_CHECK_INTERVAL):
+            self._seen_version = cache.get(VERSION_KEY)
+            self._version_checked_at = checked_at
+        return self._seen_version
+
+    def _is_stale(self, now, version):
+        return (self._next_boundary is None or now >= self._next_boundary
+                or version != self._version)
+
+    def _refresh(self, now, version):
+        from api.models import Poll
+
+        polls = Poll.objects.filter(is_deleted=False).values_list(
+            "id", "start_time", "end_time")
+        current = now.time()
+        open_ids = set()
+        next_boundary = now + datetime.timedelta(days=1)
+        for poll_id, start_time, end_time in polls:
+            if start_time <= current <= end_time:
+                open_ids.add(poll_id)
+            for boundary in (start_time, closing_time(end_time)):
+                next_boundary = min(next_boundary, next_occurrence(now, boundary))
+
+        self._open = frozenset(open_ids)
+        self._next_boundary = next_boundary
+        self._version = version
+
+
+def closing_time(end_time):
+    """ a poll is still open at its end time, it closes just after it """
+    return (datetime.datetime.combine(datetime.date.min, end_time)
+            + datetime.timedelta(microseconds=1)).time()
+
+
+def last_opened_or_closed(now, start_time, end_time):
+    """ the last time before ``now`` a poll with these times opened or closed """
+    return max(previous_occurrence(now, start_time), previous_occurrence(now, closing_time(end_time)))
+
+
+def previous_occurrence(now, time_of_day):
+    """ the last datetime up to ``now`` that falls on ``time_of_day`` """
+    moment = now.replace(hour=time_of_day.hour, minute=time_of_day.minute,
+                         second=time_of_day.second, microsecond=time_of_day.microsecond)
+    if moment > now:
+        moment -= datetime.timedelta(days=1)
+    return moment
+
+
+def next_occurrence(now, time_of_day):
+    """ the first datetime after ``now`` that falls on ``time_of_day`` """
+    moment = now.replace(hour=time_of_day.hour, minute=time_of_day.minute,
+                         second=time_of_day.second, microsecond=time_of_day.microsecond)
+    if moment <= now:
+        moment += datetime.timedelta(days=1)
+    return moment
+
+
+class CandidateDirectory:
+    """
+    Per-poll lookup of candidate names and ids used to resolve ballots.
+
+    Each poll's map is cached in process memory and in the shared cache under
+    a version key. ``invalidate()`` bumps the version once the change commits,
+    so every process drops its copy on the next read and one of them rebuilds
+    it with a single query.
+    """
+
+    def __init__(self):
+        self._local = {}
+
+    def resolve(self, poll_id, name=None, candidate_id=None):
+        """ id of the poll's candidate with the given id or name, None if there is no such candidate """
+        candidates = self.get(poll_id)
+        if candidate_id is not None:
+            try:
+                candidate_id = int(candidate_id)
+            except (TypeError, ValueError):
+                return None
+            return candidate_id if candidate_id in candidates["ids"] else None
+        return candidates["names"].get(name)
+
+    def get(self, poll_id):
+        version_key = f"polls:{poll_id}:candidates-version"
+        version = cache.get(version_key)
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(version_key)
+
+        local = self._local.get(poll_id)
+        if local is not None and local[0] == version:
+            return local[1]
+
+        key = f"polls:{poll_id}:candidates:{version}"
+        candidates = cache.get(key)
+        if candidates is None:
+            candidates = self._load(poll_id)
+            # superseded versions are never read again, let them age out
+            cache.set(key, candidates, timeout=24 * 60 * 60)
+        self._local[poll_id] = (version, candidates)
+        return candidates
+
+    def invalidate(self, poll_id):
+        # bumped any earlier, a ballot could read the old candidates and cache
+        # them under the new version
+        transaction.on_commit(lambda: self._bump_version(poll_id))
+
+    def _bump_version(self, poll_id):
+        self._local.pop(poll_id, None)
+        cache.set(f"polls:{poll_id}:candidates-version", uuid.uuid4().hex, timeout=None)
+
+    @staticmethod
+    def _load(poll_id):
+        from api.models import Candidate
+
+        names = dict(Candidate.objects.filter(poll_id=poll_id).values_list("name", "id"))
+        return {"names": names, "ids": frozenset(names.values())}
+
+
+active_polls = ActivePollRegistry()
+candidate_directory = CandidateDirectory()
@@ -0,0 +1,25 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` backed by orjson when it is installed, with the same
+    compact, UTF-8 output. Types orjson doesn't know, dates and times
+    included, are converted by DRF's own encoder so nothing renders
+    differently. Indented output and installs without orjson fall back to
+    ``JSONRenderer``.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        # like JSONRenderer, escape the two characters that are valid JSON but not valid javascript
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
@@ -1,20 +1,27 @@
 from datetime import datetime
 
-from django.db.models import Count
 from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models import prefetch_related_objects
+from django.urls import reverse
 from rest_framework import serializers
 
-from api.models import Candidate, Vote, Poll, Voter
+from api.fieldsets import SparseFieldsMixin, nested
+from api.models import Candidate, Vote, Poll, Voter, VoterImportJob, candidate_results_prefetch
 from accounts.serializers import UserDetailSerializer
 
 User = get_user_model()
 
 
-class PollListSerializer(serializers.ModelSerializer):
+class PollListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Poll
         fields = ["id", "name", "description", "start_time", "end_time"]
+        expandable_fields = {
+            "candidates": (serializers.StringRelatedField, {"many": True, "read_only": True}),
+            "is_active": (serializers.BooleanField, {"read_only": True}),
+        }
 
         
 class PollSerializer(serializers.Serializer):
@@ -29,19 +36,21 @@ class PollSerializer(serializers.Serializer):
 
 
 
-class VoteSerializer(serializers.ModelSerializer):
+class VoteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Vote
         fields = "__all__"
+        expandable_fields = {"poll": (PollListSerializer, {"read_only": True})}
 
 
-class VoterSerializer(serializers.ModelSerializer):
+class VoterSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Voter
         fields = "__all__"
         read_only_fields = ['id']
+        expandable_fields = {"poll": (PollListSerializer, {"read_only": True})}
 
     def create(self, validated_data):
         poll_data = validated_data.pop('poll')
@@ -54,7 +63,9 @@ class VoterImportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Voter
         fields = ['email', 'first_name', "last_name", 'phone_number']
-        
+        # the importer checks emails against the database a batch at a time
+        extra_kwargs = {'email': {'validators': []}}
+
 
     def create(self, validated_data):
         poll_data = validated_data.pop('poll')
@@ -62,7 +73,7 @@ class VoterImportSerializer(serializers.ModelSerializer):
         return voter
     
 
-class PollDetailSerializer(serializers.ModelSerializer):
+class PollDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     candidates = serializers.StringRelatedField(
         many=True, read_only=True, required=False)
     is_active = serializers.BooleanField()
@@ -106,15 +117,16 @@ class PollDetailSerializer(serializers.ModelSerializer):
         return instance
 
 
-class CandidateSerializer(serializers.ModelSerializer):
+class CandidateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Candidate
         fields = ['id', 'name', 'poll']
         read_only_fields = ['id']
+        expandable_fields = {"poll": (PollListSerializer, {"read_only": True})}
 
     
 
-class VoterDetailSerializer(serializers.ModelSerializer):
+class VoterDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     poll = PollDetailSerializer()
     full_name = serializers.SerializerMethodField()
 
@@ -150,7 +162,24 @@ class FileImportSerializer(serializers.Serializer):
         return file
 
 
-class CandidateDetailSerializer(serializers.ModelSerializer):
+class VoterImportJobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    error_report = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VoterImportJob
+        fields = ["id", "poll", "status", "rows_processed", "rows_accepted",
+                  "rows_rejected", "rows_per_sec", "error", "error_report", "created_at", "finished_at"]
+
+    def get_error_report(self, obj):
+        """ link to the rejected rows, once the job has written them """
+        if not obj.error_report:
+            return None
+        url = reverse("api:import_job_errors", kwargs={"job_pk": obj.pk})
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+
+class CandidateDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     vote_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -158,10 +187,29 @@ class CandidateDetailSerializer(serializers.ModelSerializer):
         fields = ["name", "vote_count"]
 
     def get_vote_count(self, obj):
-        return obj.get_vote_count()
+        """ use the count annotated by ``with_vote_count()`` when the queryset has one """
+        vote_count = getattr(obj, "vote_count", None)
+        if vote_count is None:
+            vote_count = obj.get_vote_count()
+        return vote_count
+
+
+class PollResultListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        """ fetch every poll's candidates and counts in one query instead of one per poll """
+        polls = list(data.all() if isinstance(data, models.Manager) else data)
+        self.child.prefetch(polls)
+        return super().to_representation(polls)
 
 
 class PollResultSerializer(PollDetailSerializer):
+    """
+    Result of a poll, rendered from the candidates prefetched by
+    ``Poll.objects.with_results()`` so totals and the winner need no extra queries.
+    Polls that come without the prefetch get it on the way in, cut down to
+    what the requested fields read.
+    """
     total_votes = serializers.SerializerMethodField(read_only=True)
     candidates = CandidateDetailSerializer(many=True, read_only=True)
     winner = serializers.SerializerMethodField()
@@ -169,28 +217,57 @@ class PollResultSerializer(PollDetailSerializer):
     class Meta:
         model = Poll
         fields = ["id", "name", "description", "end_time", "start_time",
-                  "candidates", "is_active", "voter", "winner", "total_votes"]
+                  "candidates", "is_active", "winner", "total_votes"]
+        list_serializer_class = PollResultListSerializer
+
+    def to_representation(self, instance):
+        self.prefetch([instance])
+        return super().to_representation(instance)
+
+    def prefetch(self, polls):
+        """ candidates for the requested fields, counted only if a requested field reads the counts """
+        fields = self.fields
+        counted = "winner" in fields or "total_votes" in fields or (
+            "candidates" in fields and "vote_count" in fields["candidates"].child.fields)
+        if counted or "candidates" in fields:
+            prefetch_results(polls, vote_count=counted)
 
     def get_total_votes(self, obj):
-        return obj.get_total_vote()
+        return sum(candidate.vote_count for candidate in obj.candidates.all())
 
     def get_winner(self, obj):
-        """get all candidates votes and arrange by descending order. winner is the first candidate"""
-        queryset = obj.candidates.annotate(vote_count=Count(
-            "candidate_votes")).order_by('-vote_count')
-        if queryset.exists():
-            winner = queryset[0]
-            serializer = CandidateDetailSerializer(winner)
+        """ candidate with the most votes, the earliest registered wins a tie """
+        candidates = obj.candidates.all()
+        if candidates:
+            winner = max(candidates, key=lambda candidate: candidate.vote_count)
+            serializer = CandidateDetailSerializer(winner, fields=nested(self.fieldsets[0], "winner"))
             return serializer.data
 
 
-class PollWinnerSerializer(serializers.ModelSerializer):
+def prefetch_results(polls, vote_count=True):
+    """ prefetch result candidates for the polls that don't already have them """
+    missing = [
+        poll for poll in polls
+        if "candidates" not in getattr(poll, "_prefetched_objects_cache", {})
+    ]
+    if missing:
+        prefetch_related_objects(missing, candidate_results_prefetch() if vote_count else models.Prefetch(
+            "candidates", queryset=Candidate.objects.order_by("id")))
+
+
+class PollWinnerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """ a leading candidate from ``Candidate.objects.winners()`` """
     poll_name = serializers.CharField(source='poll.name')
-    winner_name = serializers.CharField(source='candidate.name')
+    winner_name = serializers.CharField(source='name')
+    vote_count = serializers.IntegerField()
+    is_tie = serializers.SerializerMethodField()
 
     class Meta:
-        model = Vote
-        fields = ('poll_name', 'winner_name')
+        model = Candidate
+        fields = ('poll', 'poll_name', 'winner_name', 'vote_count', 'is_tie')
+
+    def get_is_tie(self, obj):
+        return obj.tied_with > 1
 
 class PollSerializer(serializers.Serializer):
 
@@ -0,0 +1,268 @@
+import hashlib
+import logging
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import cache as poll_cache
+from api.models import BallotFlush, CandidateTally, PendingBallot, Poll, PollResultSnapshot, Vote, Voter
+from api.pubsub import get_pubsub, poll_channel
+from api.serializers import PollResultSerializer
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SCHEDULED_KEY = "ballots:flush-scheduled"
+
+
+class AlreadyVoted(Exception):
+    """ raised when a voter tries to cast a second ballot on a poll """
+
+
+def cast_vote(poll_id, voter_id, candidate_id):
+    """
+    Record a ballot for ``voter_id`` in a single transaction.
+
+    The voter row is flipped with a conditional ``UPDATE ... WHERE is_voted = false``
+    so only one of several concurrent requests can win it, then the vote is inserted.
+    ``Vote``'s unique (poll, voted_by) constraint backs this up if a voter row is
+    ever reset by hand.
+    """
+    with transaction.atomic():
+        updated = Voter.objects.filter(
+            id=voter_id, poll_id=poll_id, is_voted=False).update(is_voted=True)
+        if not updated:
+            # only pay for the extra lookup on the rejection path
+            if not Voter.objects.filter(id=voter_id, poll_id=poll_id).exists():
+                raise Voter.DoesNotExist
+            raise AlreadyVoted
+
+        try:
+            vote = Vote.objects.create(
+                poll_id=poll_id, candidate_id=candidate_id, voted_by_id=voter_id)
+        except IntegrityError:
+            raise AlreadyVoted
+
+        add_to_tally(poll_id, candidate_id)
+        return vote
+
+
+def publish_tally(poll_id, candidate_id, amount=1):
+    """ tell live result subscribers about new votes once they are committed, and drop cached results """
+    poll_cache.invalidate(poll_id, poll_cache.RESULTS)
+    # robust: the ballot is already recorded, a broadcast that fails is logged and dropped
+    transaction.on_commit(lambda: get_pubsub().publish(
+        poll_channel(poll_id), {"candidate": candidate_id, "delta": amount}), robust=True)
+
+
+def queue_vote(poll_id, voter_id, candidate_id):
+    """
+    Accept a ballot in queued ingestion mode. The ballot is stored as a
+    ``PendingBallot``, whose unique voter column keeps one ballot per voter,
+    and a flush is scheduled to write it out with the rest of its batch.
+    """
+    is_voted = Voter.objects.filter(
+        id=voter_id, poll_id=poll_id).values_list("is_voted", flat=True).first()
+    if is_voted is None:
+        raise Voter.DoesNotExist
+    if is_voted:
+        raise AlreadyVoted
+
+    try:
+        with transaction.atomic():
+            ballot = PendingBallot.objects.create(
+                poll_id=poll_id, candidate_id=candidate_id, voted_by_id=voter_id)
+    except IntegrityError:
+        raise AlreadyVoted
+
+    schedule_ballot_flush()
+    return ballot
+
+
+def schedule_ballot_flush():
+    """ schedule a single delayed flush, however many ballots arrive before it runs """
+    from api.tasks import flush_pending_ballots
+
+    delay = settings.VOTE_INGESTION_FLUSH_DELAY
+    # the key outlives the delay so a lost task can't hold back flushes forever
+    if cache.add(FLUSH_SCHEDULED_KEY, True, timeout=max(delay * 10, 60)):
+        transaction.on_commit(
+            lambda: flush_pending_ballots.apply_async(countdown=delay))
+
+
+def flush_pending_ballots(batch_size=None):
+    """ write queued ballots out as votes in batches, returns the number of votes written """
+    batch_size = batch_size or settings.VOTE_INGESTION_BATCH_SIZE
+    started = time.perf_counter()
+    batches = written = dropped = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(PendingBallot.objects.select_for_update(
+                skip_locked=True).order_by("id")[:batch_size])
+            if not batch:
+                break
+
+            # locking the voters makes a concurrent direct vote wait for us, and
+            # anyone who voted directly since queueing is dropped here
+            fresh = set(Voter.objects.select_for_update().filter(
+                id__in=[ballot.voted_by_id for ballot in batch],
+                is_voted=False).values_list("id", flat=True))
+            ballots = [ballot for ballot in batch if ballot.voted_by_id in fresh]
+
+            Voter.objects.filter(id__in=fresh).update(is_voted=True)
+            accepted = write_ballots(ballots)
+            dropped += len(ballots) - len(accepted)
+            ballots = accepted
+            counts = Counter((ballot.poll_id, ballot.candidate_id) for ballot in ballots)
+            for (poll_id, candidate_id), amount in counts.items():
+                add_to_tally(poll_id, candidate_id, amount)
+            # ballots accepted before a poll closed can land after its result was frozen
+            for poll_id in {ballot.poll_id for ballot in ballots}:
+                discard_result_snapshot(poll_id)
+            PendingBallot.objects.filter(id__in=[ballot.id for ballot in batch]).delete()
+
+        batches += 1
+        written += len(ballots)
+
+    BallotFlush.objects.update_or_create(pk=1, defaults={
+        "finished_at": timezone.now(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        "batches": batches,
+        "votes_written": written,
+        "ballots_dropped": dropped,
+    })
+    return written
+
+
+def write_ballots(ballots):
+    """
+    Insert the ballots' votes, returns the ballots that were written. One
+    ballot that breaks a constraint fails the whole insert, so the batch is
+    then written a row at a time and the ballots that still fail are dropped;
+    left queued they would fail every flush after this one.
+    """
+    try:
+        with transaction.atomic():
+            Vote.objects.bulk_create([
+                Vote(poll_id=ballot.poll_id, candidate_id=ballot.candidate_id,
+                     voted_by_id=ballot.voted_by_id)
+                for ballot in ballots
+            ])
+        return ballots
+    except IntegrityError:
+        pass
+
+    written = []
+    for ballot in ballots:
+        try:
+            with transaction.atomic():
+                Vote.objects.create(poll_id=ballot.poll_id, candidate_id=ballot.candidate_id,
+                                    voted_by_id=ballot.voted_by_id)
+        except IntegrityError as e:
+            logger.warning("dropped queued ballot of voter %s on poll %s: %s",
+                           ballot.voted_by_id, ballot.poll_id, e)
+            continue
+        written.append(ballot)
+    return written
+
+
+def get_ingestion_metrics():
+    """ queue depth, age of the oldest queued ballot and stats from the last flush """
+    queue = PendingBallot.objects.aggregate(depth=Count("id"), oldest=Min("created_at"))
+    oldest = queue["oldest"]
+    return {
+        "mode": settings.VOTE_INGESTION_MODE,
+        "queue_depth": queue["depth"],
+        "oldest_pending_seconds": (timezone.now() - oldest).total_seconds() if oldest else 0,
+        "last_flush": BallotFlush.objects.values(
+            "finished_at", "duration_ms", "batches", "votes_written", "ballots_dropped").first(),
+    }
+
+
+def add_to_tally(poll_id, candidate_id, amount=1):
+    """ add ``amount`` votes to a random stripe of the candidate's tally """
+    stripe = random.randrange(settings.VOTE_TALLY_STRIPES)
+    tally = CandidateTally.objects.filter(candidate_id=candidate_id, stripe=stripe)
+    if not tally.update(count=F("count") + amount):
+        # first vote for this candidate, lay down all of its stripes
+        CandidateTally.objects.bulk_create(
+            new_tallies(poll_id, candidate_id), ignore_conflicts=True)
+        tally.update(count=F("count") + amount)
+    publish_tally(poll_id, candidate_id, amount)
+
+
+def remove_from_tally(poll_id, candidate_id, amount=1):
+    """ take deleted votes off a candidate's tally, deletes are rare so stripe 0 takes them all """
+    if CandidateTally.objects.filter(candidate_id=candidate_id, stripe=0).update(
+            count=F("count") - amount):
+        publish_tally(poll_id, candidate_id, -amount)
+
+
+def new_tallies(poll_id, candidate_id, count=0):
+    """ unsaved stripes for a candidate, with ``count`` held on stripe 0 """
+    return [
+        CandidateTally(poll_id=poll_id, candidate_id=candidate_id,
+                       stripe=n, count=count if n == 0 else 0)
+        for n in range(settings.VOTE_TALLY_STRIPES)
+    ]
+
+
+def rebuild_tallies(polls=None):
+    """ recount tallies from the ``Vote`` table, for all polls or the given poll ids """
+    tallies = CandidateTally.objects.all()
+    votes = Vote.objects.all()
+    if polls is not None:
+        tallies = tallies.filter(poll_id__in=polls)
+        votes = votes.filter(poll_id__in=polls)
+
+    counts = votes.values("poll_id", "candidate_id").annotate(
+        total=Count("id")).order_by()
+    with transaction.atomic():
+        tallies.delete()
+        CandidateTally.objects.bulk_create([
+            tally
+            for row in counts
+            for tally in new_tallies(row["poll_id"], row["candidate_id"], row["total"])
+        ], batch_size=1000)
+
+
+def build_result_snapshot(poll):
+    """ render and store the result of a closed poll """
+    built_at = timezone.now()
+    body = JSONRenderer().render(PollResultSerializer(poll).data)
+    snapshot, _ = PollResultSnapshot.objects.update_or_create(poll=poll, defaults={
+        "body": body.decode(),
+        "etag": hashlib.sha256(body).hexdigest(),
+        "start_time": poll.start_time,
+        "end_time": poll.end_time,
+        "built_at": built_at,
+    })
+    return snapshot
+
+
+def snapshot_closed_polls():
+    """ build a snapshot for every closed poll that lacks a current one, returns how many were built """
+    built = 0
+    for poll in Poll.objects.filter(is_deleted=False).select_related("result_snapshot"):
+        snapshot = getattr(poll, "result_snapshot", None)
+        if poll.is_active or (snapshot and snapshot.is_current()):
+            continue
+        build_result_snapshot(poll)
+        built += 1
+    return built
+
+
+def touch_poll(poll_id):
+    """ bump the poll's ``last_updated`` so conditional GETs see it changed, without firing save signals """
+    Poll.objects.filter(pk=poll_id).update(last_updated=timezone.now())
+
+
+def discard_result_snapshot(poll_id):
+    PollResultSnapshot.objects.filter(poll_id=poll_id).delete()
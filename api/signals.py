@@ -0,0 +1,56 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Candidate, Poll, Vote, Voter
+from api import cache as poll_cache
+from api.registry import active_polls, candidate_directory
+from api.services import discard_result_snapshot, remove_from_tally, touch_poll
+
+
+@receiver(post_delete, sender=Vote)
+def remove_deleted_vote_from_tally(sender, instance, origin=None, **kwargs):
+    # a poll or candidate being deleted takes its tallies and snapshot with it
+    # in the same cascade, don't spend queries on each of its votes
+    deleted = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if issubclass(deleted, (Poll, Candidate)):
+        return
+    remove_from_tally(instance.poll_id, instance.candidate_id)
+    discard_result_snapshot(instance.poll_id)
+
+
+@receiver(post_save, sender=Poll)
+def discard_snapshot_of_edited_poll(sender, instance, created, **kwargs):
+    if not created:
+        discard_result_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Poll)
+@receiver(post_delete, sender=Poll)
+def refresh_active_polls(sender, instance, **kwargs):
+    active_polls.invalidate()
+
+
+@receiver(post_save, sender=Poll)
+@receiver(post_delete, sender=Poll)
+def invalidate_cached_poll(sender, instance, created=False, **kwargs):
+    # candidate lists don't show anything of the poll but its id
+    if not created:
+        poll_cache.invalidate(instance.pk, poll_cache.DETAIL, poll_cache.RESULTS)
+
+
+@receiver(post_save, sender=Candidate)
+@receiver(post_delete, sender=Candidate)
+def discard_snapshot_of_edited_candidate(sender, instance, **kwargs):
+    if instance.poll_id:
+        discard_result_snapshot(instance.poll_id)
+        candidate_directory.invalidate(instance.poll_id)
+        touch_poll(instance.poll_id)
+        poll_cache.invalidate(instance.poll_id)
+
+
+@receiver(post_save, sender=Voter)
+def touch_poll_of_edited_voter(sender, instance, created, **kwargs):
+    # a new voter has no detail page anyone could have cached yet
+    if not created:
+        touch_poll(instance.poll_id)
@@ -0,0 +1,92 @@
+"""
+Server-Sent Events stream of live poll results, mounted in front of Django by
+``polls/asgi.py``. Each client gets one ``snapshot`` event with the current
+tallies and then a ``tally`` event for every vote published on the poll's
+channel, so connected dashboards never query the database themselves.
+"""
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+
+from api.models import Candidate, Poll
+from api.pubsub import get_pubsub, poll_channel
+
+STREAM_PATH = re.compile(r"^/api/polls/(?P<pk>\d+)/stream/$")
+KEEPALIVE_SECONDS = 15
+
+
+def get_poll_snapshot(poll_id):
+    """ current tally of every candidate on the poll, or None if there is no such poll """
+    if not Poll.objects.filter(id=poll_id).exists():
+        return None
+    candidates = list(Candidate.objects.filter(poll_id=poll_id).with_vote_count().values(
+        "id", "name", "vote_count"))
+    return {
+        "poll": poll_id,
+        "candidates": candidates,
+        "total_votes": sum(candidate["vote_count"] for candidate in candidates),
+    }
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def results_stream(scope, receive, send):
+    poll_id = int(STREAM_PATH.match(scope["path"])["pk"])
+    pubsub = get_pubsub()
+    # subscribe before reading the snapshot, a vote landing in between may show up
+    # in both but is never missed
+    subscription = pubsub.subscribe(poll_channel(poll_id))
+    try:
+        snapshot = await sync_to_async(get_poll_snapshot)(poll_id)
+        if snapshot is None:
+            await send({"type": "http.response.start", "status": 404,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body",
+                        "body": json.dumps({"error": "Poll does not exist."}).encode()})
+            return
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body",
+                    "body": format_event("snapshot", snapshot), "more_body": True})
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        messages = aiter(subscription)
+        message = None
+        try:
+            while True:
+                if message is None:
+                    message = asyncio.ensure_future(anext(messages))
+                done, _ = await asyncio.wait(
+                    {message, disconnected}, timeout=KEEPALIVE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    return
+                if message in done:
+                    try:
+                        body = format_event("tally", message.result())
+                    except StopAsyncIteration:
+                        break
+                    message = None
+                else:
+                    body = b": keepalive\n\n"
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            disconnected.cancel()
+            if message is not None:
+                message.cancel()
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        subscription.close()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
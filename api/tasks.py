@@ -1 +1,39 @@
-from celery import shared_task
\ No newline at end of file
+from celery import shared_task
+from django.core.cache import cache
+
+from api import importers, outbox, services
+from api.models import VoterImportJob
+
+
+@shared_task
+def flush_pending_ballots():
+    """ write queued ballots out as votes """
+    # clear the flag first so ballots queued while we run schedule another flush
+    cache.delete(services.FLUSH_SCHEDULED_KEY)
+    return services.flush_pending_ballots()
+
+
+@shared_task
+def snapshot_closed_polls():
+    """ freeze the results of polls that have closed """
+    return services.snapshot_closed_polls()
+
+
+@shared_task
+def import_voters(job_id):
+    """ run a background voter import job """
+    job = VoterImportJob.objects.select_related("poll").get(pk=job_id)
+    return importers.run_import_job(job).status
+
+
+@shared_task
+def queue_poll_emails(poll_id, site):
+    """ put a poll's voters who haven't been emailed in the outbox """
+    return outbox.queue_poll_emails(poll_id, site)
+
+
+@shared_task
+def drain_poll_emails():
+    """ send the outbox's due poll emails """
+    cache.delete(outbox.DRAIN_SCHEDULED_KEY)
+    return outbox.drain_outbox()
@@ -0,0 +1,901 @@
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from api import cache as poll_cache, checks, serializers
+from api.fastserializers import PollDetailValues, PollListValues, VoterDetailValues, VoterValues
+from api.importers import (
+    DUPLICATE_EMAIL_ERROR, CopyVoterImporter, VoterImporter, get_importer, run_import_job
+)
+from api.models import (
+    BallotFlush, Candidate, PendingBallot, Poll, PollEmail, PollResultSnapshot, Vote, Voter, VoterImportJob
+)
+from api.outbox import claim_emails, drain_outbox, queue_poll_emails
+from api.pubsub import get_pubsub, poll_channel
+from api.registry import VERSION_KEY, active_polls, candidate_directory
+from api.renderers import ORJSONRenderer
+from api.services import add_to_tally, cast_vote, build_result_snapshot, flush_pending_ballots, get_ingestion_metrics
+from api.streams import results_stream
+from api.tokens import BallotTokenError, BallotTokenSigner, ballot_tokens
+from api.utils import PollEmailDispatcher
+from api.validation import validate_voter_rows
+
+
+def open_times():
+    return {"start_time": datetime.time.min, "end_time": datetime.time.max}
+
+
+def closed_times():
+    """ a window that starts an hour from now, so the poll is closed whatever the time of day """
+    now = timezone.localtime()
+    return {"start_time": (now + datetime.timedelta(hours=1)).time(),
+            "end_time": (now + datetime.timedelta(hours=2)).time()}
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        # cached entries and the open poll ids would outlive the rolled back rows
+        cache.clear()
+        active_polls.invalidate()
+        self.admin = User.objects.create_superuser("admin@example.com", "password")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_poll(self, name, candidates=(), voters=0, **times):
+        poll = Poll.objects.create(name=name, **(times or open_times()))
+        for candidate in candidates:
+            Candidate.objects.create(name=f"{name}-{candidate}", poll=poll)
+        for i in range(voters):
+            Voter.objects.create(email=f"{name}-{i}@example.com", first_name=name, last_name=str(i), poll=poll)
+        return poll
+
+
+class VoterDestroyViewTests(APITestCase):
+
+    def url(self, poll, voter):
+        return reverse("api:remove_voter", kwargs={"pk": poll.pk, "voter_pk": voter.pk})
+
+    def test_deletes_only_the_voter(self):
+        poll = self.make_poll("closed", candidates=["a"], voters=3, **closed_times())
+        voter = poll.voters.first()
+
+        response = self.client.delete(self.url(poll, voter))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(Poll.objects.filter(pk=poll.pk).exists())
+        self.assertEqual(poll.candidates.count(), 1)
+        self.assertEqual(poll.voters.count(), 2)
+        self.assertFalse(Voter.objects.filter(pk=voter.pk).exists())
+
+    def test_refuses_while_the_poll_is_open(self):
+        poll = self.make_poll("open", voters=1)
+
+        response = self.client.delete(self.url(poll, poll.voters.get()))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(poll.voters.count(), 1)
+
+    def test_voter_of_another_poll_is_not_found(self):
+        poll = self.make_poll("closed", **closed_times())
+        other = self.make_poll("other", voters=1, **closed_times())
+
+        response = self.client.delete(self.url(poll, other.voters.get()))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(other.voters.count(), 1)
+
+
+class CastVoteTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.poll = self.make_poll("vote", candidates=["a", "b"], voters=2)
+        self.a, self.b = self.poll.candidates.order_by("id")
+        self.voter = self.poll.voters.order_by("email").first()
+
+    def vote(self, voter_id, poll=None, **ballot):
+        url = reverse("api:create_vote", kwargs={"pk": (poll or self.poll).pk, "voter_pk": voter_id})
+        return self.client.post(url, ballot, format="json")
+
+    def tally(self, candidate):
+        return self.poll.tallies.filter(candidate=candidate).aggregate(total=Sum("count"))["total"] or 0
+
+    def test_vote_by_candidate_name(self):
+        response = self.vote(self.voter.pk, name=self.a.name)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["vote"]["candidate"], self.a.pk)
+        self.voter.refresh_from_db()
+        self.assertTrue(self.voter.is_voted)
+        self.assertEqual(Vote.objects.get(voted_by=self.voter).candidate, self.a)
+        self.assertEqual(self.tally(self.a), 1)
+
+    def test_vote_by_candidate_id(self):
+        response = self.vote(self.voter.pk, candidate=self.b.pk)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Vote.objects.get(voted_by=self.voter).candidate, self.b)
+        self.assertEqual(self.tally(self.b), 1)
+
+    def test_second_vote_is_rejected(self):
+        self.vote(self.voter.pk, name=self.a.name)
+
+        response = self.vote(self.voter.pk, name=self.b.name)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.filter(voted_by=self.voter).count(), 1)
+        self.assertEqual(self.tally(self.b), 0)
+
+    def test_unknown_voter_is_rejected(self):
+        other = self.make_poll("other", voters=1)
+
+        for voter_id in (uuid.uuid4(), other.voters.get().pk):
+            response = self.vote(voter_id, name=self.a.name)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_unknown_candidate_is_not_found(self):
+        other = self.make_poll("other", candidates=["c"])
+
+        for ballot in ({"name": "nobody"}, {"candidate": other.candidates.get().pk}, {"candidate": "x"}):
+            response = self.vote(self.voter.pk, **ballot)
+            self.assertEqual(response.status_code, 404)
+        self.voter.refresh_from_db()
+        self.assertFalse(self.voter.is_voted)
+
+    def test_closed_poll_is_rejected(self):
+        poll = self.make_poll("closed", candidates=["c"], voters=1, **closed_times())
+
+        response = self.vote(poll.voters.get().pk, poll=poll, name="closed-c")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_failed_tally_broadcast_does_not_fail_the_vote(self):
+        pubsub = mock.Mock()
+        pubsub.publish.side_effect = ConnectionError("redis is down")
+
+        with mock.patch("api.services.get_pubsub", return_value=pubsub), \
+                self.assertLogs(level="ERROR"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.vote(self.voter.pk, name=self.a.name)
+
+        self.assertEqual(response.status_code, 201)
+        pubsub.publish.assert_called_once()
+        self.assertEqual(self.tally(self.a), 1)
+
+    def test_voting_by_voter_id_is_for_admins_only(self):
+        self.client.force_authenticate(None)
+
+        response = self.vote(self.voter.pk, name=self.a.name)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(self.client.get(reverse("api:voter_list")).status_code, 401)
+
+    def test_voter_cast_vote_only_succeeds_once(self):
+        self.assertTrue(self.voter.cast_vote())
+        self.assertTrue(self.voter.is_voted)
+        self.assertFalse(Voter.objects.get(pk=self.voter.pk).cast_vote())
+
+
+class BallotLinkTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.poll = self.make_poll("ballot", candidates=["a", "b"], voters=1)
+        self.voter = self.poll.voters.get()
+
+    def test_emailed_link_opens_the_ballot_and_votes(self):
+        PollEmailDispatcher("testserver").send(self.poll.voters.all())
+        link = mail.outbox[0].body.split("testserver", 1)[1].strip()
+
+        response = self.client.get(link)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["poll"]["candidates"], ["ballot-a", "ballot-b"])
+        self.assertFalse(response.data["is_voted"])
+        response = self.client.post(response.data["vote_url"], {"name": "ballot-b"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Vote.objects.get(voted_by=self.voter).candidate.name, "ballot-b")
+        self.assertTrue(self.client.get(link).data["is_voted"])
+
+
+class BallotTokenTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.poll = self.make_poll("token", candidates=["a"], voters=2)
+        self.voter, self.other = self.poll.voters.order_by("email")
+
+    def vote(self, token, poll=None):
+        url = reverse("api:ballot_vote", kwargs={"pk": (poll or self.poll).pk, "token": token})
+        return self.client.post(url, {"name": "token-a"}, format="json")
+
+    def test_token_verifies_to_its_poll_and_voter(self):
+        token = ballot_tokens.make_token(self.poll.pk, self.voter.pk)
+
+        self.assertEqual(ballot_tokens.verify(token), (self.poll.pk, self.voter.pk))
+        self.assertEqual(self.vote(token).status_code, 201)
+
+    def test_forged_tokens_are_refused(self):
+        token = ballot_tokens.make_token(self.poll.pk, self.voter.pk)
+        poll_id, expires, voter_hex, signature = token.split(".")
+        forged = [
+            # someone else's voter id under this voter's signature
+            ".".join([poll_id, expires, self.other.pk.hex, signature]),
+            # a later expiry
+            ".".join([poll_id, str(int(expires) + 3600), voter_hex, signature]),
+            ".".join([poll_id, expires, voter_hex, "A" * len(signature)]),
+            BallotTokenSigner(secret="another secret").make_token(self.poll.pk, self.voter.pk),
+            "not-a-token",
+        ]
+
+        for token in forged:
+            with self.assertRaises(BallotTokenError):
+                ballot_tokens.verify(token)
+            self.assertEqual(self.vote(token).status_code, 403)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_expired_token_is_refused(self):
+        token = ballot_tokens.make_token(self.poll.pk, self.voter.pk, expires=time.time() - 1)
+
+        response = self.vote(token)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data["error"], "This voting link has expired.")
+        self.assertFalse(Vote.objects.exists())
+
+    def test_token_for_another_poll_is_refused(self):
+        other = self.make_poll("elsewhere", candidates=["a"])
+        token = ballot_tokens.make_token(self.poll.pk, self.voter.pk)
+
+        self.assertEqual(self.vote(token, poll=other).status_code, 403)
+        # and the poll id can't be swapped in the token itself
+        swapped = token.replace(f"{self.poll.pk}.", f"{other.pk}.", 1)
+        self.assertEqual(self.vote(swapped, poll=other).status_code, 403)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_token_of_a_voter_who_has_voted_is_refused(self):
+        token = ballot_tokens.make_token(self.poll.pk, self.voter.pk)
+        self.assertEqual(self.vote(token).status_code, 201)
+
+        response = self.vote(token)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.filter(voted_by=self.voter).count(), 1)
+
+
+class FlushPendingBallotsTests(APITestCase):
+
+    def test_a_ballot_that_breaks_a_constraint_is_dropped_alone(self):
+        poll = self.make_poll("queued", candidates=["a", "b"], voters=4)
+        a, b = poll.candidates.order_by("id")
+        voters = list(poll.voters.order_by("email"))
+        for voter, candidate in zip(voters, [a, b, b, a]):
+            PendingBallot.objects.create(poll=poll, candidate=candidate, voted_by=voter)
+        # a vote the voter row doesn't know about, the queued ballot can't be inserted
+        Vote.objects.create(poll=poll, candidate=a, voted_by=voters[0])
+
+        self.assertEqual(flush_pending_ballots(batch_size=10), 3)
+
+        self.assertFalse(PendingBallot.objects.exists())
+        self.assertEqual(Vote.objects.filter(poll=poll).count(), 4)
+        self.assertEqual(poll.tallies.filter(candidate=b).aggregate(total=Sum("count"))["total"], 2)
+        last_flush = get_ingestion_metrics()["last_flush"]
+        self.assertEqual(last_flush["votes_written"], 3)
+        self.assertEqual(last_flush["ballots_dropped"], 1)
+        self.assertEqual(BallotFlush.objects.count(), 1)
+
+    def test_flush_discards_the_result_frozen_before_its_ballots_landed(self):
+        poll = self.make_poll("late", candidates=["a"], voters=1, **closed_times())
+        build_result_snapshot(poll)
+        PendingBallot.objects.create(poll=poll, candidate=poll.candidates.get(), voted_by=poll.voters.get())
+
+        flush_pending_ballots()
+
+        self.assertFalse(PollResultSnapshot.objects.filter(poll=poll).exists())
+        response = self.client.get(reverse("api:poll_result", kwargs={"pk": poll.pk}))
+        self.assertEqual(response.json()["total_votes"], 1)
+
+
+class OutboxTests(APITestCase):
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        poll = self.make_poll("outbox", voters=5)
+        queue_poll_emails(poll.pk, "testserver")
+
+        first = claim_emails(3, lease=60)
+        second = claim_emails(3, lease=60)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+
+    def test_drain_skips_emails_another_drain_is_sending(self):
+        poll = self.make_poll("outbox", voters=4)
+        queue_poll_emails(poll.pk, "testserver")
+        taken = claim_emails(1, lease=60)[0]
+
+        self.assertEqual(drain_outbox(time_limit=5), 3)
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertNotIn(taken.voter.email, [message.to[0] for message in mail.outbox])
+        taken.refresh_from_db()
+        self.assertEqual(taken.status, PollEmail.SENDING)
+        self.assertEqual(poll.voters.filter(email_sent=True).count(), 3)
+
+
+class PollWinnersTests(APITestCase):
+
+    def vote(self, poll, **counts):
+        for candidate in poll.candidates.all():
+            amount = counts.get(candidate.name.split("-")[-1], 0)
+            if amount:
+                add_to_tally(poll.pk, candidate.pk, amount)
+
+    def test_winners_of_every_poll_in_two_queries(self):
+        clear = self.make_poll("clear", candidates=["a", "b"])
+        tied = self.make_poll("tied", candidates=["a", "b", "c"])
+        self.make_poll("unvoted", candidates=["a"])
+        self.vote(clear, a=3, b=1)
+        self.vote(tied, a=2, b=2, c=1)
+        for i in range(5):
+            self.vote(self.make_poll(f"more{i}", candidates=["a", "b"]), b=i + 1)
+
+        # the page and its count
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("api:poll_winners"))
+
+        winners = [(row["poll_name"], row["winner_name"], row["vote_count"], row["is_tie"])
+                   for row in response.json()["results"]]
+        self.assertEqual(response.json()["count"], 8)
+        self.assertIn(("clear", "clear-a", 3, False), winners)
+        self.assertIn(("tied", "tied-a", 2, True), winners)
+        self.assertIn(("tied", "tied-b", 2, True), winners)
+        self.assertNotIn("unvoted", [row[0] for row in winners])
+
+
+class PollResultListTests(APITestCase):
+
+    def results_queries(self):
+        active_polls.open_ids()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("api:poll_results"))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_polls(self):
+        for i in range(2):
+            poll = self.make_poll(f"few{i}", candidates=["a", "b"])
+            add_to_tally(poll.pk, poll.candidates.first().pk)
+        few = self.results_queries()
+
+        for i in range(10):
+            poll = self.make_poll(f"many{i}", candidates=["a", "b", "c"])
+            add_to_tally(poll.pk, poll.candidates.first().pk, 2)
+        many = self.results_queries()
+
+        # the count, the page of polls and their candidates with vote counts
+        self.assertEqual(few, 3)
+        self.assertEqual(many, 3)
+
+    def test_results_are_counted(self):
+        poll = self.make_poll("counted", candidates=["a", "b"])
+        a, b = poll.candidates.order_by("id")
+        add_to_tally(poll.pk, a.pk, 2)
+        add_to_tally(poll.pk, b.pk, 5)
+        active_polls.open_ids()
+
+        with self.assertNumQueries(3):
+            result = self.client.get(reverse("api:poll_results")).json()["results"][0]
+
+        self.assertEqual(result["total_votes"], 7)
+        self.assertEqual(result["winner"], {"name": "counted-b", "vote_count": 5})
+        self.assertEqual(result["candidates"], [
+            {"name": "counted-a", "vote_count": 2}, {"name": "counted-b", "vote_count": 5}])
+
+
+class ValuesSerializerParityTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_poll("open", candidates=["a", "b"], voters=3)
+        closed = self.make_poll("closed", candidates=["c"], **closed_times())
+        closed.description = "closed   poll"
+        closed.save()
+        Voter.objects.create(email="phone@example.com", first_name="Ada", last_name="Obi",
+                             phone_number="+2348031234567", poll=closed)
+        self.make_poll("empty")
+
+    def assertSameOutput(self, expected, data):
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+        self.assertEqual(ORJSONRenderer().render(expected), JSONRenderer().render(expected))
+
+    def test_poll_list(self):
+        polls = Poll.objects.order_by("id")
+        self.assertSameOutput(serializers.PollListSerializer(polls, many=True).data,
+                              PollListValues.serialize(PollListValues.values(polls)))
+
+    def test_poll_detail(self):
+        polls = Poll.objects.order_by("id")
+        self.assertSameOutput(serializers.PollDetailSerializer(polls, many=True).data,
+                              PollDetailValues.serialize(PollDetailValues.values(polls)))
+
+    def test_voter_list(self):
+        voters = Voter.objects.order_by("id")
+        self.assertSameOutput(serializers.VoterSerializer(voters, many=True).data,
+                              VoterValues.serialize(VoterValues.values(voters)))
+
+    def test_voter_detail(self):
+        voters = Voter.objects.order_by("id")
+        self.assertSameOutput(serializers.VoterDetailSerializer(voters, many=True).data,
+                              VoterDetailValues.serialize(VoterDetailValues.values(voters)))
+
+
+class VoterRowValidationTests(SimpleTestCase):
+
+    def row(self, **fields):
+        return {"email": "ada@example.com", "first_name": "Ada", "last_name": "Obi",
+                "phone_number": "08031234567", **fields}
+
+    def test_errors_match_the_serializer(self):
+        missing_name = self.row()
+        del missing_name["first_name"]
+        rows = [
+            self.row(),
+            self.row(email=" ada@example.com ", phone_number=""),
+            self.row(email="not an email"),
+            self.row(email="ada@@example.com"),
+            self.row(email="ada@example"),
+            self.row(email=""),
+            missing_name,
+            self.row(first_name="   "),
+            self.row(last_name="x" * 300),
+            self.row(phone_number="12345"),
+            self.row(phone_number="+234 803 abc 4567"),
+            self.row(phone_number="080312345678901234"),
+            self.row(email=None, phone_number=42),
+            "not a row",
+        ]
+
+        results = validate_voter_rows(rows)
+
+        for row, (data, errors) in zip(rows, results):
+            serializer = serializers.VoterImportSerializer(data=row)
+            with self.subTest(row=row):
+                self.assertEqual(serializer.is_valid(), errors is None)
+                self.assertEqual(errors, None if errors is None else serializer.errors)
+        self.assertEqual([errors is None for data, errors in results[:2]], [True, True])
+        self.assertEqual(set(results[6][1]), {"first_name"})
+        self.assertEqual(set(results[9][1]), {"phone_number"})
+
+
+class PollListConditionalTests(APITestCase):
+
+    def test_a_poll_opening_changes_the_list_validators(self):
+        self.make_poll("later", **closed_times())
+        url = reverse("api:polls") + "?expand=is_active"
+        response = self.client.get(url)
+        self.assertFalse(response.json()["results"][0]["is_active"])
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # the poll opens an hour from now
+        later = timezone.localtime() + datetime.timedelta(hours=1, minutes=30)
+        with mock.patch("api.conditional.timezone.localtime", return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_each_representation_has_its_own_etag(self):
+        self.make_poll("poll")
+        url = reverse("api:polls")
+        full = self.client.get(url)
+        sparse = self.client.get(url + "?fields=id,name")
+
+        self.assertNotEqual(full["ETag"], sparse["ETag"])
+        response = self.client.get(url + "?fields=id,name", HTTP_IF_NONE_MATCH=full["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], [{"id": Poll.objects.get().pk, "name": "poll"}])
+
+
+class VoterDetailQueryTests(APITestCase):
+
+    def url(self, voter):
+        return reverse("api:voter_detail", kwargs={"pk": voter.poll_id, "voter_pk": voter.pk})
+
+    def test_voter_page_queries_are_fixed(self):
+        poll = self.make_poll("page", candidates=[str(i) for i in range(10)], voters=2)
+        first, second = poll.voters.order_by("email")
+        active_polls.open_ids()
+
+        # validator and voter row, plus the poll and its candidates for the first page
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url(first))
+        self.assertEqual(len(response.json()["poll"]["candidates"]), 10)
+        # every other voter of the poll shares the cached poll part
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url(second))
+        self.assertEqual(response.json()["email"], second.email)
+
+
+class DetailConditionalTests(APITestCase):
+
+    def assertConditional(self, url, edit):
+        """ both validators answer 304 until ``edit()`` runs, then neither does """
+        response = self.client.get(url)
+        etag, modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+
+        # Last-Modified only has whole seconds, edit a little later
+        later = timezone.now() + datetime.timedelta(seconds=5)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            edit()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_poll_detail(self):
+        poll = self.make_poll("detail", candidates=["a"])
+
+        def edit():
+            poll.description = "edited"
+            poll.save()
+
+        self.assertConditional(reverse("api:poll_detail", kwargs={"pk": poll.pk}), edit)
+
+    def test_poll_detail_changes_with_its_candidates(self):
+        poll = self.make_poll("detail", candidates=["a"])
+
+        self.assertConditional(reverse("api:poll_detail", kwargs={"pk": poll.pk}),
+                               lambda: Candidate.objects.create(name="detail-b", poll=poll))
+
+    def test_voter_detail(self):
+        poll = self.make_poll("detail", candidates=["a"], voters=1)
+        voter = poll.voters.get()
+
+        def edit():
+            voter.first_name = "Edited"
+            voter.save()
+
+        self.assertConditional(reverse("api:voter_detail", kwargs={"pk": poll.pk, "voter_pk": voter.pk}), edit)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportJobTests(APITestCase):
+
+    def make_job(self, poll):
+        register = "email,first_name,last_name,phone_number\n" + "".join(
+            f"voter{i}@example.com,Voter,{i},\n" for i in range(20))
+        job = VoterImportJob(poll=poll)
+        job.file.save("register.csv", ContentFile(register.encode()))
+        return job
+
+    def test_finished_job_records_its_throughput(self):
+        poll = self.make_poll("import", **closed_times())
+
+        job = run_import_job(self.make_job(poll))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, VoterImportJob.FINISHED)
+        self.assertEqual(job.rows_accepted, 20)
+        self.assertGreater(job.rows_per_sec, 0)
+
+    def test_unexpected_error_fails_the_job_and_is_raised(self):
+        poll = self.make_poll("import", **closed_times())
+        job = self.make_job(poll)
+
+        with mock.patch.object(VoterImporter, "run", side_effect=DatabaseError("connection lost")):
+            with self.assertRaises(DatabaseError):
+                run_import_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, VoterImportJob.FAILED)
+        self.assertEqual(job.error, "connection lost")
+        self.assertIsNotNone(job.finished_at)
+
+
+class BulkVoterRegistrationTests(APITestCase):
+
+    def test_batch_conflict_only_rejects_the_clashing_row(self):
+        poll = self.make_poll("bulk", voters=1, **closed_times())
+        items = [{"email": email, "first_name": "Voter", "last_name": "Bulk"}
+                 for email in ["new0@example.com", "bulk-0@example.com", "new1@example.com"]]
+
+        # registered between the duplicate check and the insert
+        with mock.patch.object(VoterImporter, "filter_duplicates", side_effect=iter):
+            response = self.client.post(reverse("api:poll_voters", kwargs={"pk": poll.pk}), items, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["rejected"], 1)
+        self.assertIn("id", response.data["results"][0])
+        self.assertIn("errors", response.data["results"][1])
+        self.assertIn("id", response.data["results"][2])
+        self.assertEqual(poll.voters.count(), 3)
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY and ON CONFLICT need PostgreSQL")
+class CopyVoterImporterTests(APITestCase):
+
+    def test_copy_merge_reports_conflicts_by_line(self):
+        poll = self.make_poll("copy", voters=1, **closed_times())
+        rows = [
+            {"email": "new1@example.com", "first_name": "New", "last_name": "One",
+             "phone_number": "+2348031234567"},
+            # already registered, only the merge finds out
+            {"email": "copy-0@example.com", "first_name": "Old", "last_name": "Voter", "phone_number": ""},
+            {"email": "new2@example.com", "first_name": "New", "last_name": "Two", "phone_number": ""},
+            # repeated within the file
+            {"email": "new1@example.com", "first_name": "New", "last_name": "Again", "phone_number": ""},
+            {"email": "not an email", "first_name": "Bad", "last_name": "Row", "phone_number": ""},
+        ]
+        created, rejected = {}, {}
+
+        with override_settings(VOTER_IMPORT_USE_COPY=True):
+            importer = get_importer(
+                poll, batch_size=2, created_sink=created.__setitem__,
+                error_sink=lambda number, row, errors: rejected.__setitem__(number, (row, errors)))
+        self.assertIsInstance(importer, CopyVoterImporter)
+        importer.run(rows)
+
+        self.assertEqual((importer.imported, importer.rejected), (2, 3))
+        self.assertEqual(sorted(rejected), [2, 4, 5])
+        self.assertEqual(rejected[2], (
+            {"email": "copy-0@example.com", "first_name": "Old", "last_name": "Voter", "phone_number": ""},
+            {"email": [DUPLICATE_EMAIL_ERROR]}))
+        self.assertEqual(rejected[4][1], {"email": [DUPLICATE_EMAIL_ERROR]})
+        self.assertIn("email", rejected[5][1])
+
+        new1 = Voter.objects.get(email="new1@example.com")
+        self.assertEqual((new1.pk, new1.poll, new1.last_name), (created[1], poll, "One"))
+        self.assertEqual(str(new1.phone_number), "+2348031234567")
+        self.assertEqual(Voter.objects.get(email="new2@example.com").pk, created[3])
+        self.assertEqual(Voter.objects.get(email="copy-0@example.com").first_name, "copy")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_tables WHERE tablename LIKE 'api_voter_import_%'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class VoteDeletionTests(APITestCase):
+
+    def poll_with_votes(self, name, votes):
+        poll = self.make_poll(name, candidates=["a"], voters=votes)
+        candidate = poll.candidates.get()
+        for voter in poll.voters.all():
+            cast_vote(poll.pk, voter.pk, candidate.pk)
+        return poll
+
+    def delete_queries(self, instance):
+        with CaptureQueriesContext(connection) as queries:
+            instance.delete()
+        return len(queries)
+
+    def test_deleting_a_poll_costs_the_same_however_many_votes_it_has(self):
+        few = self.delete_queries(self.poll_with_votes("few", 1))
+        many = self.delete_queries(self.poll_with_votes("many", 10))
+
+        self.assertEqual(few, many)
+        self.assertFalse(Vote.objects.exists())
+
+    def test_deleting_a_candidate_costs_the_same_however_many_votes_it_has(self):
+        few = self.delete_queries(self.poll_with_votes("few", 1).candidates.get())
+        many = self.delete_queries(self.poll_with_votes("many", 10).candidates.get())
+
+        self.assertEqual(few, many)
+
+    def test_deleting_a_vote_takes_it_off_the_tally(self):
+        poll = self.poll_with_votes("tally", 3)
+
+        Vote.objects.filter(poll=poll).first().delete()
+
+        self.assertEqual(poll.get_total_vote(), 2)
+
+    def test_votes_cannot_be_added_or_edited_in_the_admin(self):
+        poll = self.poll_with_votes("admin", 1)
+        self.client.force_login(self.admin)
+
+        self.assertEqual(self.client.get(reverse("admin:api_vote_add")).status_code, 403)
+        response = self.client.post(reverse("admin:api_vote_change", args=[Vote.objects.get().pk]),
+                                    {"poll": poll.pk, "candidate": poll.candidates.get().pk,
+                                     "voted_by": poll.voters.get().pk})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(poll.get_total_vote(), 1)
+
+
+class ActivePollRegistryTests(APITestCase):
+
+    def test_shared_version_is_read_once_per_interval(self):
+        poll = self.make_poll("open")
+        active_polls.open_ids()
+
+        with mock.patch("api.registry.cache.get", wraps=cache.get) as cache_get:
+            for _ in range(100):
+                self.assertTrue(active_polls.is_open(poll.pk))
+
+        self.assertLessEqual(cache_get.call_count, 1)
+
+    def test_changes_in_this_process_are_seen_at_once(self):
+        poll = self.make_poll("open")
+        self.assertTrue(active_polls.is_open(poll.pk))
+
+        poll.start_time, poll.end_time = closed_times().values()
+        poll.save()
+
+        self.assertFalse(active_polls.is_open(poll.pk))
+
+    def test_shared_version_is_bumped_once_the_change_commits(self):
+        poll = self.make_poll("open")
+        version = cache.get(VERSION_KEY)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            poll.save()
+            self.assertEqual(cache.get(VERSION_KEY), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(cache.get(VERSION_KEY), version)
+
+    def test_changes_in_other_processes_are_seen_after_the_interval(self):
+        poll = self.make_poll("open")
+        self.assertTrue(active_polls.is_open(poll.pk))
+        # another process closed the poll and bumped the shared version
+        Poll.objects.filter(pk=poll.pk).update(**closed_times())
+        cache.set(VERSION_KEY, "changed elsewhere", timeout=None)
+
+        with mock.patch("api.registry.time.monotonic", return_value=time.monotonic() + 2):
+            self.assertFalse(active_polls.is_open(poll.pk))
+
+
+class PollCacheTests(APITestCase):
+
+    def test_concurrent_misses_compute_once(self):
+        calls, results = [], []
+        computing, release = threading.Event(), threading.Event()
+
+        def compute():
+            calls.append(threading.get_ident())
+            computing.set()
+            release.wait(5)
+            return {"name": "computed"}
+
+        def read():
+            results.append(poll_cache.get_or_compute(1, poll_cache.DETAIL, compute))
+
+        first = threading.Thread(target=read)
+        first.start()
+        computing.wait(5)
+        # the second reader finds the lock taken and waits for the first one's value
+        second = threading.Thread(target=read)
+        second.start()
+        time.sleep(poll_cache.POLL_INTERVAL * 2)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"name": "computed"}] * 2)
+
+    def test_failed_compute_releases_the_lock(self):
+        def fail():
+            raise DatabaseError("connection lost")
+
+        with self.assertRaises(DatabaseError):
+            poll_cache.get_or_compute(1, poll_cache.DETAIL, fail)
+
+        compute = mock.Mock(return_value={"name": "computed"})
+        self.assertEqual(poll_cache.get_or_compute(1, poll_cache.DETAIL, compute), {"name": "computed"})
+        compute.assert_called_once()
+
+    def test_invalidate_drops_the_entry_once_the_change_commits(self):
+        poll_cache.get_or_compute(1, poll_cache.DETAIL, lambda: "old")
+        poll_cache.get_or_compute(1, poll_cache.RESULTS, lambda: "results")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            poll_cache.invalidate(1, poll_cache.DETAIL)
+            self.assertEqual(poll_cache.get_or_compute(1, poll_cache.DETAIL, lambda: "new"), "old")
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(poll_cache.get_or_compute(1, poll_cache.DETAIL, lambda: "new"), "new")
+        self.assertEqual(poll_cache.get_or_compute(1, poll_cache.RESULTS, lambda: "recomputed"), "results")
+
+
+class CandidateDirectoryTests(APITestCase):
+
+    def test_new_candidate_resolves_once_it_commits(self):
+        poll = self.make_poll("directory", candidates=["a"])
+        self.assertIsNone(candidate_directory.resolve(poll.pk, name="directory-b"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            candidate = Candidate.objects.create(name="directory-b", poll=poll)
+            # read before the commit, the old map must not be kept under the new version
+            self.assertIsNone(candidate_directory.resolve(poll.pk, name="directory-b"))
+
+        self.assertEqual(candidate_directory.resolve(poll.pk, name="directory-b"), candidate.pk)
+
+
+class ResultsStreamTests(APITestCase):
+
+    async def stream(self, poll, tally):
+        """ open the poll's stream, publish ``tally`` once the snapshot is out, return the events """
+        events = []
+        disconnect = asyncio.Event()
+        snapshot_sent = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message["body"]:
+                event, data = message["body"].decode().strip().split("\n")
+                events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+                snapshot_sent.set()
+                if len(events) == 2:
+                    disconnect.set()
+
+        scope = {"type": "http", "path": f"/api/polls/{poll.pk}/stream/"}
+        stream = asyncio.ensure_future(results_stream(scope, receive, send))
+        await asyncio.wait_for(snapshot_sent.wait(), timeout=5)
+        get_pubsub().publish(poll_channel(poll.pk), tally)
+        await asyncio.wait_for(stream, timeout=5)
+        return events
+
+    def test_published_tally_reaches_the_subscriber(self):
+        poll = self.make_poll("live", candidates=["a"])
+        candidate = poll.candidates.get()
+
+        events = async_to_sync(self.stream)(poll, {"candidate": candidate.pk, "delta": 1})
+
+        self.assertEqual(events, [
+            ("snapshot", {"poll": poll.pk, "total_votes": 0, "candidates": [
+                {"id": candidate.pk, "name": candidate.name, "vote_count": 0}]}),
+            ("tally", {"candidate": candidate.pk, "delta": 1}),
+        ])
+
+
+class SystemCheckTests(TestCase):
+
+    @mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "2"})
+    def test_local_pubsub_with_several_workers_is_only_a_warning(self):
+        messages = checks.check_results_pubsub(None)
+
+        self.assertEqual([message.id for message in messages], ["api.W002"])
+        self.assertFalse(any(message.is_serious() for message in messages))
+
+    @mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "2"})
+    def test_local_cache_with_several_workers_is_only_a_warning(self):
+        messages = checks.check_poll_cache(None)
+
+        self.assertEqual([message.id for message in messages], ["api.W003"])
+        self.assertFalse(any(message.is_serious() for message in messages))
@@ -24,13 +24,22 @@ urlpatterns = [
     path('polls/<int:pk>/', views.PollDetailView.as_view(), name='poll_detail'),
     path('polls/<int:pk>/delete/', views.PollDestroyView.as_view(), name='poll_delete'),
     path('polls/<int:pk>/voters/', views.PollVoterView.as_view(), name='poll_voters'),
-    path('polls/<int:pk>/voters/<int:voter_pk>/delete/', views.VoterDestroyView.as_view(), name='remove_voter'),
+    path('polls/<int:pk>/voters/<uuid:voter_pk>/delete/', views.VoterDestroyView.as_view(), name='remove_voter'),
     path('polls/<int:pk>/import/', views.VoterImportView.as_view(), name='import_voters'),
+    path('imports/<uuid:job_pk>/', views.VoterImportJobView.as_view(), name='import_job'),
+    path('imports/<uuid:job_pk>/errors/', views.VoterImportErrorsView.as_view(), name='import_job_errors'),
     path('polls/<int:pk>/candidates/', views.CandidateListCreateView.as_view(), name='list_create_candidate'),
-    path('polls/<int:pk>/voters/<int:voter_pk>/vote/', views.CreateVoteView.as_view(), name='create_vote'),
+    path('polls/<int:pk>/candidates/<int:candidate_pk>/', views.CandidateUpdateView.as_view(), name='update_candidate'),
+    path('polls/<int:pk>/voters/<uuid:voter_pk>/vote/', views.CreateVoteView.as_view(), name='create_vote'),
+    path('ballots/metrics/', views.BallotQueueMetricsView.as_view(), name='ballot_metrics'),
+    path('polls/results/', views.PollResultListView.as_view(), name='poll_results'),
+    path('polls/winners/', views.PollWinnersView.as_view(), name='poll_winners'),
+    path('polls/<int:pk>/ballot/<str:token>/', views.BallotView.as_view(), name='ballot'),
+    path('polls/<int:pk>/ballot/<str:token>/vote/', views.BallotVoteView.as_view(), name='ballot_vote'),
     path('polls/<int:pk>/result/', views.PollResultView.as_view(), name='poll_result'),
     path('voters/', views.VoterListView.as_view(), name='voter_list'),
-    path('polls/<int:pk>/voters/<int:voter_pk>/', views.VoterDetailView.as_view(), name="voter_detail"),
+    path('polls/<int:pk>/voters/<uuid:voter_pk>/', views.VoterDetailView.as_view(), name="voter_detail"),
+    path('exports/<slug:dataset>.<slug:file_format>', views.ExportView.as_view(), name='export'),
     path("send-email/<int:poll_pk>/", views.SendPollEmailView.as_view(), name="send-email"),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui')
 ]
@@ -1,57 +1,120 @@
+import logging
 import smtplib
 import datetime
+import time
 
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from django.core.mail import send_mail
 from api.models import Voter
+from api.tokens import ballot_tokens
+
+logger = logging.getLogger(__name__)
 
 # User = get_user_model()
 # users = User.objects.filter(voters__isnull=False).distinct()
 
 
-class Util:
+class PollEmailDispatcher:
+    """
+    Sends poll invitations over a single mail connection.
+
+    Voters are streamed from the database and their messages rendered from a
+    body compiled once per poll, then handed to the backend ``batch_size`` at a
+    time with ``send_messages``. If a batch fails its messages are retried one
+    by one, and only the voters whose email actually went out are marked with
+    ``email_sent``, one update per batch.
+    """
+    subject = 'Poll Notification'
+    body = 'Please participate in the poll. Click the link below:\n\n{link}'
+    # stands in for the token while the voting link is reversed once per poll
+    token_placeholder = 'ballot-token'
+
+    def __init__(self, current_site, batch_size=None, connection=None):
+        self.current_site = current_site
+        self.batch_size = batch_size or settings.POLL_EMAIL_BATCH_SIZE
+        self.connection = connection or get_connection()
+        self.expires = int(time.time() + settings.BALLOT_TOKEN_MAX_AGE)
+        self.templates = {}
+        self.sent = 0
+        self.failed = 0
 
-    @staticmethod
-    def send_email(data):
+    def send(self, voters):
+        voters = voters.only('id', 'email', 'poll_id').order_by()
+        with self.connection:
+            batch = []
+            for voter in voters.iterator(chunk_size=self.batch_size):
+                batch.append(voter)
+                if len(batch) >= self.batch_size:
+                    self.send_batch(batch)
+                    batch = []
+            if batch:
+                self.send_batch(batch)
+        return self.sent
+
+    def send_batch(self, voters):
+        delivered, errors = self.deliver(voters)
+        Voter.objects.filter(id__in=[voter.id for voter in delivered]).update(email_sent=True)
+        self.sent += len(delivered)
+        self.failed += len(errors)
+
+    def deliver(self, voters):
+        """ email the voters, returns the ones reached and the errors of the others by voter id """
+        messages = self.render(voters)
         try:
-            email = EmailMessage(
-                subject=data['email_subject'],
-                body=data['email_body'],
-                from_email=settings.EMAIL_HOST_USER,
-                to=[data['to_email']]
-            )
-            email.send()
-        except smtplib.SMTPException as e:
-            print(f"An error occured: {e}")
-
-    @staticmethod
-    def send_poll_email(voters, current_site):
-        
+            self.connection.send_messages(messages)
+            return voters, {}
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning("Sending a batch of %s poll emails failed, retrying one at a time: %s",
+                           len(messages), e)
+
+        # whatever went out before the failure is sent again, a repeated link beats a missing one
+        delivered, errors = [], {}
+        for voter, message in zip(voters, messages):
+            error = self.send_one(message)
+            if error is None:
+                delivered.append(voter)
+            else:
+                errors[voter.id] = error
+        return delivered, errors
+
+    def send_one(self, message):
+        """ send a message on a fresh connection, returns the error if it could not be sent """
+        self.connection.close()
+        try:
+            self.connection.open()
+            self.connection.send_messages([message])
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error("Could not send the poll email to %s: %s", message.to[0], e)
+            return str(e) or e.__class__.__name__
+        return None
+
+    def render(self, voters):
+        by_poll = {}
+        for voter in voters:
+            by_poll.setdefault(voter.poll_id, []).append(voter.id)
+        tokens = {}
+        for poll_id, voter_ids in by_poll.items():
+            tokens.update(zip(voter_ids, ballot_tokens.make_tokens(poll_id, voter_ids, self.expires)))
+
+        messages = []
         for voter in voters:
-            poll_id = voter.poll.id
-            voter_id = voter.uuid
-            voter_email = voter.email
-            
-            voter_link = reverse('frontend:vote', args=[poll_id, voter_id])
-
-            # Update the voter to mark that their poll email has been sent
-            voter.email_sent = True
-            voter.save()
-            print(voter)
-            # Send the poll email to the voter
-            try:
-                send_mail(
-                    subject='Poll Notification',
-                    message=f'Please participate in the poll. Click the link below:\n\n{current_site}{voter_link}',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[voter_email],
-                    fail_silently=True,
-                )
-            except smtplib.SMTPException as e:
-                print(f"An error occured: {e}")
-            
-    
+            head, tail = self.template(voter.poll_id)
+            messages.append(EmailMessage(
+                subject=self.subject,
+                body=head + tokens[voter.id] + tail,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[voter.email],
+                connection=self.connection,
+            ))
+        return messages
 
+    def template(self, poll_id):
+        """ the poll's message body split around where the voter's token goes """
+        if poll_id not in self.templates:
+            link = reverse('api:ballot', args=[poll_id, self.token_placeholder])
+            body = self.body.format(link=f'{self.current_site}{link}')
+            head, tail = body.split(self.token_placeholder)
+            self.templates[poll_id] = (head, tail)
+        return self.templates[poll_id]
@@ -0,0 +1,142 @@
+"""
+Batch validation of imported voter rows.
+
+``validate_voter_rows`` accepts and rejects rows exactly as
+``VoterImportSerializer`` does, but settles the usual well-formed field with
+cheap inline checks and memoized phone number and email domain lookups instead
+of running the serializer for every row. A field that fails any of those checks
+goes through the serializer's own field, so a rejected row carries the very
+errors the serializer reports for it.
+"""
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import django
+from django.conf import settings
+from django.core.validators import validate_email
+from django.utils.encoding import punycode
+from phonenumber_field.phonenumber import PhoneNumber, to_python
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from api.serializers import VoterImportSerializer
+
+# phonenumbers ignores these between digits, numbers differing only in them parse the same
+PHONE_SEPARATORS = re.compile(r"[ ().-]")
+PLAIN_PHONE_NUMBER = re.compile(r"^\+?[ ().-]*\d[\d ().-]*$", re.ASCII)
+
+
+@lru_cache(maxsize=65536)
+def phone_number_is_valid(number):
+    """ what ``validate_international_phonenumber`` makes of the number """
+    phone_number = to_python(number)
+    return not isinstance(phone_number, PhoneNumber) or phone_number.is_valid()
+
+
+def check_phone_number(value):
+    if PLAIN_PHONE_NUMBER.match(value):
+        value = PHONE_SEPARATORS.sub("", value)
+    return phone_number_is_valid(value)
+
+
+@lru_cache(maxsize=4096)
+def email_domain_is_valid(domain):
+    """ the domain half of ``EmailValidator``, a register shares a handful of domains """
+    if domain in validate_email.domain_allowlist or validate_email.validate_domain_part(domain):
+        return True
+    try:
+        return validate_email.validate_domain_part(punycode(domain))
+    except UnicodeError:
+        return False
+
+
+def check_email(value):
+    if "@" not in value:
+        return False
+    user_part, domain_part = value.rsplit("@", 1)
+    return bool(validate_email.user_regex.match(user_part)) and email_domain_is_valid(domain_part)
+
+
+CHECKS = {'email': check_email, 'phone_number': check_phone_number}
+
+
+@lru_cache(maxsize=None)
+def import_fields():
+    return VoterImportSerializer().fields
+
+
+def passes_checks(field, check, value):
+    """ whether the serializer field is certain to accept the value """
+    if type(value) is not str:
+        return False
+    value = value.strip()
+    if not value:
+        return field.allow_blank
+    if len(value) > field.max_length or "\x00" in value:
+        return False
+    if not value.isascii() and any("\ud800" <= char <= "\udfff" for char in value):
+        return False
+    return check is None or check(value)
+
+
+def validate_row(row):
+    """ ``(validated data, None)`` for a valid row, ``(None, errors)`` otherwise """
+    if not isinstance(row, dict):
+        serializer = VoterImportSerializer(data=row)
+        if serializer.is_valid():
+            return serializer.validated_data, None
+        return None, serializer.errors
+
+    data, errors = {}, {}
+    for name, field in import_fields().items():
+        value = row.get(name, empty)
+        if value is empty and not field.required:
+            continue
+        if passes_checks(field, CHECKS.get(name), value):
+            data[name] = value.strip()
+            continue
+        try:
+            data[name] = field.run_validation(value)
+        except serializers.ValidationError as e:
+            errors[name] = e.detail
+    if errors:
+        return None, errors
+    return data, None
+
+
+def validate_voter_rows(rows):
+    """ validate a chunk of rows, one ``validate_row`` result per row in order """
+    return [validate_row(row) for row in rows]
+
+
+class VoterRowValidator:
+    """
+    Validates chunks of rows in this process, or splits each chunk over a pool
+    of ``workers`` processes when there is more than one. The pool is started
+    on first use and stopped by ``close()``.
+    """
+
+    def __init__(self, workers=None):
+        if workers is None:
+            workers = settings.VOTER_IMPORT_VALIDATION_WORKERS
+        if multiprocessing.current_process().daemon:
+            # celery's prefork children are daemons, which may not start processes
+            workers = 0
+        self.workers = workers
+        self.pool = None
+
+    def __call__(self, rows):
+        if self.workers < 2 or len(rows) < 2 * self.workers:
+            return validate_voter_rows(rows)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=django.setup)
+        size = -(-len(rows) // self.workers)
+        chunks = [rows[start:start + size] for start in range(0, len(rows), size)]
+        return [result for chunk in self.pool.map(validate_voter_rows, chunks) for result in chunk]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -1,8 +1,13 @@
-import csv
+import json
 
+from django.conf import settings
 from django.db import transaction
+from django.urls import reverse
 from django.contrib.sites.shortcuts import get_current_site
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import condition
 
 from rest_framework import generics
 from rest_framework.views import APIView
@@ -11,28 +16,65 @@ from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 
-from api import serializers
+from api import cache as poll_cache, fieldsets, serializers
 from accounts.models import User
-from api.models import Candidate, Poll, Vote, Voter
+from api.models import Candidate, Poll, PollResultSnapshot, Voter, VoterImportJob
+from api.pagination import DefaultPagination, IdCursorPagination
 from api.permissions import IsAdminOrReadOnly
-from api.utils import Util
-
-
-class PollListCreateView(generics.ListCreateAPIView):
+from api.registry import active_polls, candidate_directory
+from api.conditional import (
+    poll_detail_etag, poll_detail_modified, poll_list_etag, poll_list_modified,
+    voter_detail_etag, voter_detail_modified
+)
+from api.exports import EXPORTS, FORMATS as EXPORT_FORMATS, export_lines
+from api.fastserializers import PollListValues, VoterDetailValues, VoterValues, poll_detail
+from api.importers import register_voters
+from api.outbox import get_outbox_counts
+from api.tasks import import_voters, queue_poll_emails
+from api.tokens import BallotTokenError, ballot_tokens
+from api.services import (
+    AlreadyVoted, build_result_snapshot, cast_vote, get_ingestion_metrics, queue_vote
+)
+
+
+class ValuesListMixin:
+    """ list from ``values()`` rows through ``values_serializer`` instead of the model serializer """
+    values_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        fields, expand = fieldsets.requested(request)
+        rows = self.values_serializer.values(self.filter_queryset(self.get_queryset()), fields, expand)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.values_serializer.serialize(page, fields, expand))
+        return Response(self.values_serializer.serialize(rows, fields, expand))
+
+
+@method_decorator(condition(etag_func=poll_list_etag, last_modified_func=poll_list_modified), name="get")
+class PollListCreateView(ValuesListMixin, generics.ListCreateAPIView):
     serializer_class = serializers.PollListSerializer
+    values_serializer = PollListValues
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = IdCursorPagination
     # permission_classes = []
 
     def get_queryset(self):
         return Poll.objects.all()  # only get active polls
 
 
+@method_decorator(condition(etag_func=poll_detail_etag, last_modified_func=poll_detail_modified), name="get")
 class PollDetailView(generics.RetrieveUpdateAPIView):
     """ Endpoint that show details about active poll with user detail"""
     queryset = Poll.objects.all()  # only get active polls
     serializer_class = serializers.PollDetailSerializer
     permission_classes = [IsAdminOrReadOnly]
 
+    def retrieve(self, request, *args, **kwargs):
+        data = poll_detail(self.kwargs["pk"], fieldsets.requested(request)[0])
+        if data is None:
+            raise Http404
+        return Response(data)
+
     def put(self, request, *args, **kwargs):
         poll = self.get_object()
         serializer = self.get_serializer(poll, data=request.data, partial=True)
@@ -67,6 +109,15 @@ class CandidateListCreateView(generics.ListCreateAPIView):
         poll_id = self.kwargs["pk"]
         return Candidate.objects.filter(poll_id=poll_id)
 
+    def list(self, request, *args, **kwargs):
+        fields, expand = fieldsets.requested(request)
+        if expand:
+            # the cached list holds the bare poll ids, expanded polls are read fresh
+            return super().list(request, *args, **kwargs)
+        return Response(fieldsets.trim(poll_cache.get_or_compute(
+            self.kwargs["pk"], poll_cache.CANDIDATES,
+            lambda: serializers.CandidateSerializer(self.get_queryset(), many=True).data), fields))
+
     def perform_create(self, serializer):
         poll_id = self.kwargs["pk"]
         poll = Poll.objects.filter(id=poll_id).first()
@@ -95,41 +146,59 @@ class CandidateUpdateView(generics.UpdateAPIView):
 
     def get_object(self):
         candidate_id = self.kwargs['candidate_pk']
-        return self.queryset.get(id=candidate_id)
+        return self.queryset.get(id=candidate_id, poll_id=self.kwargs['pk'])
 
     def update(self, request, *args, **kwargs):
-        instance = self.get_object()
+        try:
+            instance = self.get_object()
+        except Candidate.DoesNotExist:
+            return Response({'error': 'Candidate does not exist.'}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(
             instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
 
-        # Access the validated poll object from the serializer
-        poll = serializer.validated_data.get('poll')
-
-        # Check if the poll exists
-        if not Poll.objects.filter(id=poll.id).exists():
-            return Response({'error': 'Poll with this ID does not exist'}, status=status.HTTP_404_NOT_FOUND)
-
         self.perform_update(serializer)
+        # the save signal refreshes the new poll's ballot lookup, a candidate
+        # moved off a poll has to be dropped from the old one too
+        candidate_directory.invalidate(self.kwargs['pk'])
         return Response(serializer.data)
 
 
-class VoterListView(generics.ListAPIView):
+class VoterListView(ValuesListMixin, generics.ListAPIView):
     """ list of all voters """
     serializer_class = serializers.VoterSerializer
+    values_serializer = VoterValues
     queryset = Voter.objects.all()
-    # permission_classes = [I]
+    pagination_class = IdCursorPagination
+    permission_classes = [IsAdminUser]
 
 
+@method_decorator(condition(etag_func=voter_detail_etag, last_modified_func=voter_detail_modified), name="get")
 class VoterDetailView(generics.RetrieveAPIView):
+    """
+    The page an emailed voter lands on. The voter's own fields come from a
+    single query and the poll part is shared by every voter of the poll.
+    """
     queryset = Voter.objects.all()
     serializer_class = serializers.VoterDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        fields, expand = fieldsets.requested(request)
+        voters = self.get_queryset().filter(pk=self.kwargs["voter_pk"], poll_id=self.kwargs["pk"])
+        data = VoterDetailValues.serialize(VoterDetailValues.values(voters, fields), fields)
+        if not data:
+            raise Http404
+        return Response(data[0])
+
 
 class PollVoterView(generics.ListCreateAPIView):
-    """List all voters in a poll and add voters to the poll through an admin"""
+    """
+    List all voters in a poll and add voters to the poll through an admin.
+    POST a JSON array to register many voters at once.
+    """
     serializer_class = serializers.VoterSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         return Voter.objects.filter(poll_id=self.kwargs["pk"])
@@ -162,221 +231,265 @@ class PollVoterView(generics.ListCreateAPIView):
             return Response({'poll_id': ['Poll is still active']}, status=status.HTTP_400_BAD_REQUEST)
         
         self.poll = poll
+        if isinstance(request.data, list):
+            return self.bulk_create(request.data)
         return super().post(request, *args, **kwargs)
 
+    def bulk_create(self, items):
+        if len(items) > settings.VOTER_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.VOTER_BULK_MAX_ITEMS} voters can be registered at once'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        importer, results = register_voters(self.poll, items)
+        return Response({
+            'created': importer.imported,
+            'rejected': importer.rejected,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if importer.imported else status.HTTP_400_BAD_REQUEST)
+
 
 
 class VoterDestroyView(generics.DestroyAPIView):
-    """ delete voter """
-    queryset = Poll.objects.all()
+    """ delete a voter from a poll that isn't open """
     serializer_class = serializers.VoterSerializer
     permission_classes = [IsAdminUser]
+    lookup_url_kwarg = "voter_pk"
 
     def get_queryset(self):
-        return Poll.objects.filter(voters__id=self.kwargs["voter_pk"])
+        return Voter.objects.filter(poll_id=self.kwargs["pk"])
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        if not instance.is_active:
-            self.perform_destroy(instance)
-            return Response({"message": "Voter successfully deleted"}, status=status.HTTP_204_NO_CONTENT)
-        return Response({"message: Can't delete a voter on an active poll"})
+        if active_polls.is_open(instance.poll_id):
+            return Response({"error": "Can't delete a voter on an active poll"}, status=status.HTTP_400_BAD_REQUEST)
+        self.perform_destroy(instance)
+        return Response({"message": "Voter successfully deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 
 class VoterImportView(APIView):
-    """ import voters using a csv"""
+    """ import voters using a csv, the import runs as a background job """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsAdminUser]
 
     def post(self, request, *args, **kwargs):
-        file = request.FILES.get('file')
-        print(file.name)
-        """ Check that the file uploaded is csv file"""
-        if not file.name.endswith(".csv"):
-            return Response(
-                "File type not supported. file must be a csv file")
-
-        try:
-            decoded_file = file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-
-            """Collect all the rows with errors instead of returning on the first error"""
-            errors = []
-
-            with transaction.atomic():
-                for row in reader:
-                    row_serializer = serializers.VoterImportSerializer(
-                        data=row)
-
-                    if not row_serializer.is_valid():
-                        errors.append(
-                            {'row': row, 'errors': row_serializer.errors})
-                        continue
+        serializer = serializers.FileImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file = serializer.validated_data.get("file")
 
-                    poll_id = self.kwargs['pk']
-                    poll = Poll.objects.filter(id=poll_id).first()
+        poll = Poll.objects.filter(id=self.kwargs['pk']).first()
+        if not poll:
+            return Response({'error': 'Poll with this ID does not exist'}, status=status.HTTP_404_NOT_FOUND)
 
-                    if not poll:
-                        errors.append({'row': row, 'errors': {'poll_id': [
-                            'Poll with this ID does not exist']}})
-                        continue
+        if poll.is_active:  # only add a poll before polls begin
+            return Response({'status': "Poll is still active"})
 
-                    if poll.is_active:  # only add a poll before polls begin
-                        return Response({'status': "Poll is still active"})
+        job = VoterImportJob.objects.create(poll=poll, file=file)
+        transaction.on_commit(lambda: import_voters.delay(job.pk))
+        serializer = serializers.VoterImportJobSerializer(job, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-                    email = row_serializer.validated_data['email']
 
-                    # Check if voter already exists for this poll
-                    if Voter.objects.filter(email=email, poll=poll).exists():
-                        errors.append({'row': row, 'errors': {
-                            'email': ['Voter with this user and poll ID already exists']}})
-                        continue
+class VoterImportJobView(generics.RetrieveAPIView):
+    """ progress of a voter import job """
+    queryset = VoterImportJob.objects.all()
+    serializer_class = serializers.VoterImportJobSerializer
+    permission_classes = [IsAdminUser]
+    lookup_url_kwarg = "job_pk"
 
-                    # Instantiate the voter object
-                    voter = Voter(**row_serializer.validated_data, poll=poll)
-                    voter.save()
 
-                if errors:
-                    transaction.rollback()
-                    # If there are any errors, return a response with errors
-                    return Response({'status': 'failure', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
-                transaction.commit()
-                # If no errors, return a success response
-                return Response({'status': 'success'}, status=status.HTTP_201_CREATED)
+class VoterImportErrorsView(generics.RetrieveAPIView):
+    """ download the rows an import job rejected, as csv """
+    queryset = VoterImportJob.objects.all()
+    permission_classes = [IsAdminUser]
+    lookup_url_kwarg = "job_pk"
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if not job.error_report:
+            return Response({'error': 'This import has no rejected rows.'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(job.error_report.open("rb"), as_attachment=True,
+                            filename=f"import-{job.pk}-errors.csv", content_type="text/csv")
 
 
-class VoterImportView(APIView):
-    """ import voters using a csv"""
-    parser_classes = (MultiPartParser, FormParser)
+class CreateVoteView(generics.CreateAPIView):
+    """ cast a ballot on behalf of a voter, voters themselves vote through their emailed ballot link """
+    serializer_class = serializers.VoteSerializer
+    permission_classes = [IsAdminUser]
 
     def post(self, request, *args, **kwargs):
-        serializer = serializers.FileImportSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        file = serializer.validated_data.get("file")
+        return self.cast(request, self.kwargs["pk"], self.kwargs["voter_pk"])
+
+    def cast(self, request, poll_id, voter_id):
+        if not active_polls.is_open(poll_id):
+            if not Poll.objects.filter(id=poll_id).exists():
+                return Response({'error': 'Poll does not exist.'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'error': 'Poll is not active.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ballots name the candidate or give its id
+        candidate_id = candidate_directory.resolve(
+            poll_id, name=request.data.get("name"), candidate_id=request.data.get("candidate"))
+        if candidate_id is None:
+            return Response({'error': 'Candidate does not exist.'}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            decoded_file = file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-
-            """Collect all the rows with errors instead of returning on the first error"""
-            errors = []
-
-            for row in reader:
-                row_serializer = serializers.VoterImportSerializer(data=row)
-
-                if not row_serializer.is_valid():
-                    errors.append(
-                        {'row': row, 'errors': row_serializer.errors})
-                    continue
-
-                poll_id = self.kwargs['pk']
-                poll = Poll.objects.filter(id=poll_id).first()
-
-                if not poll:
-                    errors.append({'row': row, 'errors': {'poll_id': [
-                                  'Poll with this ID does not exist']}})
-                    continue
+            if settings.VOTE_INGESTION_MODE == "queued":
+                queue_vote(poll_id, voter_id, candidate_id)
+                return Response({"success": "Thank you for voting"}, status=status.HTTP_202_ACCEPTED)
+            vote = cast_vote(poll_id, voter_id, candidate_id)
+        except Voter.DoesNotExist:
+            return Response({'error': 'This user is not registered to vote in this poll.'}, status=status.HTTP_400_BAD_REQUEST)
+        except AlreadyVoted:
+            return Response({'error': 'This voter has already cast a vote for this poll.'}, status=status.HTTP_400_BAD_REQUEST)
 
-                if poll.is_active:  # only add a poll before polls begin
-                    return Response({'status': "Poll is still active"})
+        serializer = serializers.VoteSerializer(vote)
+        return Response({"success": "Thank you for voting", "vote": serializer.data}, status=status.HTTP_201_CREATED)
 
-                email = row_serializer.validated_data['email']
 
-                # Check if voter already exists for this poll
-                if Voter.objects.filter(email=email, poll=poll).exists():
-                    errors.append({'row': row, 'errors': {
-                                  'email': ['Voter with this user and poll ID already exists']}})
-                    continue
+class BallotTokenMixin:
+    """ views keyed by the ballot token of an emailed voting link """
+    permission_classes = []
 
-                voter = Voter(**row_serializer.validated_data, poll=poll)
-                voter.save()
+    def verify_token(self):
+        """ the voter the url's token was issued to and None, or None and the response refusing it """
+        try:
+            poll_id, voter_id = ballot_tokens.verify(self.kwargs["token"])
+        except BallotTokenError as e:
+            return None, Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+        if poll_id != self.kwargs["pk"]:
+            return None, Response({'error': 'Invalid ballot token.'}, status=status.HTTP_403_FORBIDDEN)
+        return voter_id, None
 
-            if errors:
-                # If there are any errors, rollback the transaction and return a response with errors
-                transaction.rollback()
-                return Response({'status': 'failure', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
 
-            # If no errors, commit the transaction and return a success response
-            transaction.commit()
-            return Response({'status': 'success'}, status=status.HTTP_201_CREATED)
+class BallotView(BallotTokenMixin, APIView):
+    """ the ballot an emailed voting link opens, the poll and its candidates and where to post the vote """
 
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, *args, **kwargs):
+        voter_id, refused = self.verify_token()
+        if refused:
+            return refused
+        poll_id = self.kwargs["pk"]
+        is_voted = Voter.objects.filter(
+            id=voter_id, poll_id=poll_id).values_list("is_voted", flat=True).first()
+        poll = poll_detail(poll_id)
+        if is_voted is None or poll is None:
+            return Response({'error': 'This user is not registered to vote in this poll.'},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "poll": poll,
+            "is_voted": is_voted,
+            "vote_url": request.build_absolute_uri(
+                reverse("api:ballot_vote", args=[poll_id, self.kwargs["token"]])),
+        })
+
+
+class BallotVoteView(BallotTokenMixin, CreateVoteView):
+    """ cast the ballot of the voter an emailed ballot token was issued to """
 
+    def post(self, request, *args, **kwargs):
+        # a signed link already vouches for the voter, no lookup needed
+        voter_id, refused = self.verify_token()
+        if refused:
+            return refused
+        return self.cast(request, self.kwargs["pk"], voter_id)
 
-class CreateVoteView(generics.CreateAPIView):
-    serializer_class = serializers.VoteSerializer
-    permission_classes = []
 
-    def post(self, request, *args, **kwargs):
-        poll_id = self.kwargs["pk"]
-        # candidate_id = self.kwargs["candidate_pk"]
-        voter_id = self.kwargs["voter_pk"]
+class BallotQueueMetricsView(APIView):
+    """ queue depth and flush latency of the queued vote ingestion mode """
+    permission_classes = [IsAdminUser]
 
-        try:
-            """ get only active polls. Can't vote before start time"""
-            poll = Poll.objects.get(id=poll_id)
-            selected_candidate = poll.candidates.get(name=request.data.get("name"))
-            # candidate = Candidate.objects.get(id=candidate_id)
-
-            voter = Voter.objects.filter(poll=poll, uuid=voter_id)
-
-            """ check if voter has voted """
-            if voter.cast_vote():
-                vote = Vote.objects.create(
-                    poll=poll, candidate=selected_candidate, voted_by=voter)
-                serializer = serializers.VoteSerializer(vote)
-                return Response({"success": "Thank you for voting"}, serializer.data, status=status.HTTP_201_CREATED)
-            else:
-                return Response({'error': 'This voter has already cast a vote for this poll.'}, status=status.HTTP_400_BAD_REQUEST)
-        except Poll.DoesNotExist:
-            return Response({'error': 'Poll does not exist.'}, status=status.HTTP_404_NOT_FOUND)
-        except Candidate.DoesNotExist:
-            return Response({'error': 'Candidate does not exist.'}, status=status.HTTP_404_NOT_FOUND)
-        except Voter.DoesNotExist:
-            return Response({'error': 'This user is not registered to vote in this poll.'}, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, *args, **kwargs):
+        return Response(get_ingestion_metrics())
 
 
 class PollResultView(generics.RetrieveAPIView):
+    """ live result of an open poll, closed polls are served from their frozen snapshot """
     queryset = Poll.objects.all()
     serializer_class = serializers.PollResultSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        fields, expand = fieldsets.requested(request)
+        if active_polls.is_open(self.kwargs["pk"]):
+            return Response(fieldsets.trim(poll_cache.get_or_compute(
+                self.kwargs["pk"], poll_cache.RESULTS,
+                lambda: serializers.PollResultSerializer(self.get_object()).data), fields))
+
+        snapshot = PollResultSnapshot.objects.filter(poll_id=self.kwargs["pk"]).first()
+        if snapshot is None or not snapshot.is_current():
+            poll = self.get_object()
+            if poll.is_active:
+                return super().retrieve(request, *args, **kwargs)
+            snapshot = build_result_snapshot(poll)
+        if fields is not None:
+            # the snapshot is stored whole, cut a copy of it down
+            return Response(fieldsets.trim(json.loads(snapshot.body), fields))
+
+        etag = quote_etag(snapshot.etag)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(snapshot.body, content_type="application/json")
+        response["ETag"] = etag
+        return response
+
+
+class PollResultListView(generics.ListAPIView):
+    """ results of every poll """
+    # the serializer prefetches what the requested fields need
+    queryset = Poll.objects.filter(is_deleted=False).order_by("id")
+    serializer_class = serializers.PollResultSerializer
+    pagination_class = DefaultPagination
+
 
 class PollWinnersView(generics.ListAPIView):
-    """ get a list of polls that have been voted on """
-    queryset = Poll.objects.filter(poll_votes__isnull=False).distinct()
+    """ winners of every poll that has been voted on, ties list each leading candidate """
     serializer_class = serializers.PollWinnerSerializer
+    pagination_class = DefaultPagination
 
-    def get(self, request, *args, **kwargs):
-        winners = []
-        for poll in self.get_queryset():
-            votes = Vote.objects.filter(poll=poll)
-            winner = max(votes, key=lambda vote: vote.candidate_votes.count())
-            winners.append(winner.candidate)
-        serializer = self.get_serializer(winners, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return Candidate.objects.winners().select_related("poll").order_by("poll_id", "name")
 
 
 class SendPollEmailView(APIView):
-    authentication_classes = []
-    permission_classes = []
+    """ queue the poll's invitation emails (POST) or see how far sending has got (GET) """
+    permission_classes = [IsAdminUser]
 
     def get(self, request, *args, **kwargs):
-        voters = Voter.objects.filter(poll_id=self.kwargs["poll_pk"])
-        # print(voters)
+        return Response(get_outbox_counts(self.kwargs["poll_pk"]))
+
+    def post(self, request, *args, **kwargs):
+        if not Poll.objects.filter(id=self.kwargs["poll_pk"]).exists():
+            return Response({"error": "Poll does not exist."}, status=status.HTTP_404_NOT_FOUND)
         current_site = get_current_site(request).domain
-        Util.send_poll_email(voters, current_site)
+        transaction.on_commit(
+            lambda: queue_poll_emails.delay(self.kwargs["poll_pk"], current_site))
+        return Response({'message': 'Poll emails queued'}, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportView(APIView):
+    """ stream voters, turnout or anonymized ballots as csv or json lines, ?poll=<id> for one poll """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        dataset, file_format = self.kwargs["dataset"], self.kwargs["file_format"]
+        if dataset not in EXPORTS or file_format not in EXPORT_FORMATS:
+            return Response({"error": "Unknown export."}, status=status.HTTP_404_NOT_FOUND)
+        poll_id = request.query_params.get("poll")
+        if poll_id is not None and not poll_id.isdigit():
+            return Response({"error": "poll must be a poll id."}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'message': 'Poll emails sent successfully'})
+        response = StreamingHttpResponse(
+            export_lines(dataset, file_format, poll_id), content_type=EXPORT_FORMATS[file_format])
+        name = f"{dataset}-poll-{poll_id}" if poll_id else dataset
+        response["Content-Disposition"] = f'attachment; filename="{name}.{file_format}"'
+        return response
 
 
 class TestView(generics.ListAPIView):
     serializer_class = serializers.VoterSerializer
     queryset = Voter.objects.all()
-    permission_classes = []
+    permission_classes = [IsAdminUser]
+    pagination_class = IdCursorPagination
 
 
 def test_view(request):
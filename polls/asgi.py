@@ -2,6 +2,8 @@
 ASGI config for polls project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live result streams (``/api/polls/<pk>/stream/``) are served here without
+going through Django's request handling.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +15,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "polls.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after Django is set up, the stream reads models
+from api.streams import STREAM_PATH, results_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """ serve live result streams directly and hand everything else to Django """
+    if scope["type"] == "http" and STREAM_PATH.match(scope["path"]):
+        return await results_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -7,6 +7,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'polls.settings')
 
 app = Celery('polls')
 
+# Read CELERY_* settings from the Django settings module.
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
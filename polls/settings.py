@@ -52,6 +52,7 @@ INSTALLED_APPS = [
     "accounts",
     "api",
     "phonenumber_field",
+    "django_celery_results",
     # "frontend",
     # "myapp",
     # "voting"
@@ -112,6 +113,27 @@ DATABASES = {
     "default": dj_database_url.config(default=DATABASE_URL, conn_max_age=1000)
 }
 
+# redis://host:6379/0 or memcached://host:11211 in production, process memory otherwise.
+# Process memory only suits a single web process with direct vote ingestion,
+# api.checks warns about it for several web workers and refuses it for VOTE_INGESTION_MODE=queued
+CACHE_URL = os.environ.get("CACHE_URL", "locmem://")
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+    }}
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": CACHE_URL[len("memcached://"):],
+    }}
+else:
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }}
+# seconds cached poll details, candidate lists and results live without being invalidated
+POLL_CACHE_TIMEOUT = int(os.environ.get("POLL_CACHE_TIMEOUT", 10 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -151,6 +173,10 @@ STATIC_URL = "static/"
 # STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT =os.path.join(BASE_DIR, 'staticfiles')
 
+# uploaded files: candidate images, voter import registers and their error reports
+MEDIA_URL = "media/"
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
 
 
 # Default primary key field type
@@ -168,6 +194,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # renders with orjson when it is installed, like JSONRenderer otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -190,13 +221,84 @@ EMAIL_PORT = os.environ.get('EMAIL_PORT')
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS')
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+# deliver account emails from celery, turn off to send them before the request returns
+ACCOUNT_EMAIL_ASYNC = os.environ.get('ACCOUNT_EMAIL_ASYNC', 'True') == 'True'
+ACCOUNT_EMAIL_MAX_ATTEMPTS = int(os.environ.get('ACCOUNT_EMAIL_MAX_ATTEMPTS', 5))
+# seconds before the first retry of a failed account email, doubling after that
+ACCOUNT_EMAIL_RETRY_DELAY = int(os.environ.get('ACCOUNT_EMAIL_RETRY_DELAY', 30))
+# a verification email still pending after this many seconds may be sent again
+ACCOUNT_EMAIL_RESEND_INTERVAL = int(os.environ.get('ACCOUNT_EMAIL_RESEND_INTERVAL', 5 * 60))
 
 CORS_ALLOW_ALL_ORIGINS = True
 
 # Celery Configuration
-CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Replace with your Celery broker URL
-CELERY_RESULT_BACKEND = 'django-db'  # Use Django database as the result backend
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'django-db')  # Use Django database as the result backend
+# run tasks inline instead of sending them to the broker, for local testing
+# (pair with CELERY_BROKER_URL=memory:// when no redis is running)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER') == 'True'
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Africa/Lagos'
+CELERY_BEAT_SCHEDULE = {
+    'snapshot-closed-polls': {
+        'task': 'api.tasks.snapshot_closed_polls',
+        'schedule': 60.0,
+    },
+    # sends outbox retries as they fall due
+    'drain-poll-emails': {
+        'task': 'api.tasks.drain_poll_emails',
+        'schedule': 60.0,
+    },
+    # writes out queued ballots whose scheduled flush was lost, a broker
+    # hiccup or worker restart would otherwise leave them uncounted
+    'flush-pending-ballots': {
+        'task': 'api.tasks.flush_pending_ballots',
+        'schedule': 60.0,
+    },
+}
+
+# rows fetched per round trip when streaming an export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Voting
+# number of counter rows each candidate's tally is split across
+VOTE_TALLY_STRIPES = int(os.environ.get('VOTE_TALLY_STRIPES', 4))
+
+# "direct" writes each ballot as it arrives, "queued" stores it as a pending
+# ballot and answers 202 while a celery worker writes ballots in batches
+VOTE_INGESTION_MODE = os.environ.get('VOTE_INGESTION_MODE', 'direct')
+VOTE_INGESTION_BATCH_SIZE = int(os.environ.get('VOTE_INGESTION_BATCH_SIZE', 500))
+# seconds to wait for more ballots before a flush runs
+VOTE_INGESTION_FLUSH_DELAY = float(os.environ.get('VOTE_INGESTION_FLUSH_DELAY', 1))
+
+# backend that fans tally updates out to live result streams: api.pubsub.LocalPubSub
+# within a single process, api.pubsub.RedisPubSub across the web and celery processes
+RESULTS_PUBSUB_BACKEND = os.environ.get('RESULTS_PUBSUB_BACKEND', 'api.pubsub.LocalPubSub')
+# redis server RedisPubSub publishes through, the celery broker's by default
+RESULTS_PUBSUB_URL = os.environ.get('RESULTS_PUBSUB_URL', CELERY_BROKER_URL)
+
+# seconds an emailed voting link stays valid
+BALLOT_TOKEN_MAX_AGE = int(os.environ.get('BALLOT_TOKEN_MAX_AGE', 7 * 24 * 60 * 60))
+# poll emails handed to the mail backend per send_messages call
+POLL_EMAIL_BATCH_SIZE = int(os.environ.get('POLL_EMAIL_BATCH_SIZE', 100))
+# outbox sends per second and the largest burst allowed, set to the SMTP provider's quota
+POLL_EMAIL_RATE_LIMIT = float(os.environ.get('POLL_EMAIL_RATE_LIMIT', 10))
+POLL_EMAIL_BURST = int(os.environ.get('POLL_EMAIL_BURST', 50))
+# a failed email is retried after POLL_EMAIL_RETRY_DELAY seconds, doubling each time
+POLL_EMAIL_RETRY_DELAY = int(os.environ.get('POLL_EMAIL_RETRY_DELAY', 60))
+POLL_EMAIL_MAX_RETRY_DELAY = int(os.environ.get('POLL_EMAIL_MAX_RETRY_DELAY', 60 * 60))
+POLL_EMAIL_MAX_ATTEMPTS = int(os.environ.get('POLL_EMAIL_MAX_ATTEMPTS', 6))
+# seconds one drain task keeps sending before handing over to the next
+POLL_EMAIL_DRAIN_SECONDS = int(os.environ.get('POLL_EMAIL_DRAIN_SECONDS', 50))
+
+# rows validated and inserted together by the voter importer
+VOTER_IMPORT_BATCH_SIZE = int(os.environ.get('VOTER_IMPORT_BATCH_SIZE', 1000))
+# voters one JSON request to a poll's voter list may register
+VOTER_BULK_MAX_ITEMS = int(os.environ.get('VOTER_BULK_MAX_ITEMS', 10000))
+# processes each batch's validation is split over, 0 or 1 validates in the importing process
+VOTER_IMPORT_VALIDATION_WORKERS = int(os.environ.get('VOTER_IMPORT_VALIDATION_WORKERS', 0))
+# load voter registers with COPY into a staging table when running on postgres,
+# off by default (api.tests.CopyVoterImporterTests covers it when the tests run on postgres)
+VOTER_IMPORT_USE_COPY = os.environ.get('VOTER_IMPORT_USE_COPY', 'False') == 'True'